@@ -10,7 +10,7 @@ def analyze_finances(df, api_key=None):
     Gera uma análise financeira usando o Google Gemini.
     Usa a chave configurada nos Secrets do Streamlit.
     Args:
-        df (pd.DataFrame): DataFrame com colunas 'Data', 'Descrição', 'Categoria', 'Valor'.
+        df (pd.DataFrame): DataFrame com colunas 'Data', 'Descrição', 'Categoria', 'Centavos'.
     """
     try:
         # Tenta pegar a chave dos segredos
@@ -90,22 +90,23 @@ def prepare_data_summary(df):
     if df.empty:
         return "Sem dados disponíveis."
         
-    # Totais
-    total_entradas = df[df['Valor'] > 0]['Valor'].sum()
-    total_saidas = df[df['Valor'] < 0]['Valor'].abs().sum()
+    # Totais (somados em centavos, convertidos para reais só no texto)
+    centavos = df['Centavos']
+    total_entradas = centavos[centavos > 0].sum() / 100
+    total_saidas = -centavos[centavos < 0].sum() / 100
     saldo = total_entradas - total_saidas
     
     # Top Categorias
-    rank_cat = df[df['Valor'] < 0].groupby('Categoria')['Valor'].sum().abs().sort_values(ascending=False).head(5)
+    rank_cat = -df[centavos < 0].groupby('Categoria', observed=True)['Centavos'].sum().sort_values().head(5) / 100
     rank_cat_str = "\n".join([f"- {cat}: R$ {val:,.2f}" for cat, val in rank_cat.items()])
     
     # Top 10 Gastos Específicos (para ver onde foi o dinheiro)
-    top_itens = df[df['Valor'] < 0].sort_values('Valor').head(10)
-    itens_str = "\n".join([f"- {row['Data'].strftime('%d/%m')} | {row['Descrição']} | R$ {abs(row['Valor']):,.2f}" for _, row in top_itens.iterrows()])
+    top_itens = df[centavos < 0].sort_values('Centavos').head(10)
+    itens_str = "\n".join([f"- {row['Data'].strftime('%d/%m')} | {row['Descrição']} | R$ {abs(row['Centavos']) / 100:,.2f}" for _, row in top_itens.iterrows()])
     
     # Gastos com Conveniência e Farmácia (Foco do usuário)
-    gasto_conv = df[(df['Categoria'] == 'Conveniência') & (df['Valor'] < 0)]['Valor'].sum()
-    gasto_farm = df[(df['Categoria'] == 'Farmácia') & (df['Valor'] < 0)]['Valor'].sum()
+    gasto_conv = centavos[(df['Categoria'] == 'Conveniência') & (centavos < 0)].sum() / 100
+    gasto_farm = centavos[(df['Categoria'] == 'Farmácia') & (centavos < 0)].sum() / 100
     
     summary = f"""
     - **Total Receitas**: R$ {total_entradas:,.2f}
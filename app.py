@@ -10,6 +10,8 @@ import ai_consultant
 import rules_manager
 import auth
 import budget_manager # [NEW] Import manager
+import transaction_store
+import search_index
 import time
 
 # Configuração da Página
@@ -322,23 +324,52 @@ with st.sidebar:
         help="Suporta: Nubank, Mercado Pago, Bradesco, Itaú, Inter e XLS genérico."
     )
     
+    username = st.session_state['username']
+    try:
+        transaction_store.load_manifest(username)
+    except RuntimeError as e:
+        # Manifesto corrompido: para antes de qualquer gravação sobrescrever o histórico
+        st.error(f"{e}. Nada foi alterado; restaure o manifesto para continuar.")
+        st.stop()
     if uploaded_files:
-        # DATA ISOLATION: Pass username to enforce rules and void fake data
-        df = load_data(uploaded_files, username=st.session_state['username'])
-        # Resumo Mínimalista
-        if not df.empty and 'Banco' in df.columns:
-            df['Mes_Ref'] = df['Data'].dt.to_period('M')
-            summary = df.groupby(['Banco', 'Mes_Ref']).size().reset_index()
-            with st.expander("📋 Arquivos Carregados", expanded=False):
-                for _, row in summary.iterrows():
-                    st.caption(f"✅ {row['Banco']} • {row['Mes_Ref'].strftime('%m/%Y')}")
-    else:
-        # DATA ISOLATION: Pass username (will return empty if user exists)
-        df = load_data(None, username=st.session_state['username'])
+        # Cada upload é processado e gravado UMA vez no armazenamento do usuário
+        saved_ids = st.session_state.setdefault('arquivos_salvos', set())
+        new_files = [f for f in uploaded_files if f.file_id not in saved_ids]
+        if new_files:
+            # DATA ISOLATION: Pass username to enforce rules and void fake data
+            df_new = load_data(new_files, username=username)
+            report = df_new.attrs.get('arquivos', [])
+            n_new = transaction_store.append_transactions(username, df_new, [r['hash'] for r in report if r['hash']])
+            st.session_state['relatorio_arquivos'] = report
+            st.session_state['novas_transacoes'] = (n_new, len(df_new))
+            saved_ids.update(f.file_id for f in new_files)
+    
+    # Histórico persistido (usuário que volta não precisa reenviar nada)
+    df = transaction_store.load_transactions(username)
+    # Cubo diário (dia x banco x categoria) para KPIs e gráficos
+    cube = transaction_store.load_cube(username)
+    
+    # Resumo Mínimalista
+    if not df.empty and 'Banco' in df.columns:
+        # Agrupa sem acrescentar colunas ao histórico (mantém o esquema compacto)
+        summary = df.groupby([df['Banco'], df['Data'].dt.to_period('M').rename('Mes_Ref')], observed=True).size().reset_index()
+        with st.expander("📋 Arquivos Carregados", expanded=False):
+            for _, row in summary.iterrows():
+                st.caption(f"✅ {row['Banco']} • {row['Mes_Ref'].strftime('%m/%Y')}")
+            if 'novas_transacoes' in st.session_state:
+                n_new, n_read = st.session_state['novas_transacoes']
+                st.caption(f"➕ {n_new} transações novas no último envio ({n_read - n_new} já existiam)")
+            for rep in st.session_state.get('relatorio_arquivos', []):
+                if rep.get('repetido'):
+                    st.caption(f"↩️ {rep['arquivo']}: arquivo já importado anteriormente")
+                if rep.get('erro'):
+                    st.caption(f"❌ {rep['arquivo']}: não foi possível ler ({rep['erro']})")
+                if rep['falhas_valor']:
+                    st.caption(f"⚠️ {rep['arquivo']}: {rep['falhas_valor']} valor(es) não reconhecido(s), considerados R$ 0,00")
     
     if df.empty:
         st.warning("Nenhum dado carregado. Faça upload dos seus extratos.")
-        df = pd.DataFrame(columns=['Data', 'Descrição', 'Categoria', 'Valor', 'Banco'])
+        df = transaction_store.compact_frame(pd.DataFrame(columns=['Data', 'Descrição', 'Categoria', 'Valor', 'Banco']))
 
     st.divider()
 
@@ -368,11 +399,9 @@ with st.sidebar:
         with st.expander("🎯 **Metas**", expanded=False):
             meta_gastos = st.number_input("Teto Mensal (R$)", min_value=0.0, value=5000.0, step=100.0)
 
-        # Aplica Filtros
-        df_filtered = transform.filter_data(df, start_date, end_date, selected_banks, selected_cats)
     else:
-        df_filtered = pd.DataFrame()
         start_date, end_date = datetime.today(), datetime.today()
+        selected_banks, selected_cats = [], []
         meta_gastos = 5000.0
 
 if df.empty:
@@ -402,11 +431,18 @@ if df.empty:
 # (Data filtered in Sidebar above)
 
 
-# Calcula KPIs
-entradas, saidas, saidas_abs, saldo, taxa_poupanca = transform.get_kpis(df_filtered)
-
-# Calcula Comparativo (Mês/Período Anterior)
-delta_saidas, delta_entradas, _, _ = transform.get_period_comparison(df, start_date, end_date)
+# Filtros + análise consolidada (KPIs, fluxo mensal, ranking, Pix) + comparativos
+# (período anterior, mês anterior, ano anterior, 12 meses). Memoizado por versão
+# dos dados e filtros: cliques em contas/metas não recalculam nada.
+versao = transaction_store.load_manifest(username)['versao']
+daily_totals = transaction_store.load_daily_totals(username)
+pix_index = transaction_store.load_pix_index(username)
+dashboard = transform.get_dashboard(username, versao, df, cube, daily_totals, start_date, end_date, selected_banks, selected_cats, pix_index)
+df_filtered = dashboard['df_filtered']
+cube_filtered = dashboard['cube_filtered']
+analytics = dashboard['analytics']
+comparisons = dashboard['comparisons']
+delta_saidas, delta_entradas = dashboard['delta_saidas'], dashboard['delta_entradas']
 
 # [NEW] Sincroniza Meta Global com a soma das Metas Detalhadas (se houver)
 total_detailed_budget = sum(user_budgets.values()) if 'user_budgets' in locals() else 0
@@ -414,12 +450,8 @@ if total_detailed_budget > 0:
     meta_gastos = total_detailed_budget
 
 # Detecta Assinaturas
-subs_df = transform.detect_subscriptions(df)
+subs_df = transform.get_subscriptions(username, versao, df)
 
-# Prepara dados para gráficos
-monthly_data = transform.get_monthly_flow(df_filtered)
-cat_ranking, expenses_df = transform.get_categories_ranking(df_filtered)
-pix_only, total_pix, qtd_pix, avg_pix, max_pix, pix_rank = transform.get_pix_metrics(df_filtered)
 
 # -----------------------------------------------------------------------------
 # 4. VIEW (Presentation)
@@ -442,28 +474,30 @@ tab_overview, tab_categories, tab_pix, tab_subs, tab_metas, tab_manager, tab_ai,
 
 with tab_overview:
     # Empacota dados para a view
-    kpi_data = (entradas, saidas, saidas_abs, saldo, taxa_poupanca, delta_entradas, delta_saidas, meta_gastos)
-    views.render_overview_tab(monthly_data, df_filtered, kpi_data)
+    views.render_overview_tab(analytics, delta_entradas, delta_saidas, meta_gastos, comparisons)
 
 with tab_categories:
-    views.render_categories_tab(cat_ranking, expenses_df)
+    views.render_categories_tab(analytics.category_ranking, analytics.expenses)
     
 with tab_pix:
-    views.render_pix_tab(pix_only, pix_rank, total_pix, qtd_pix, avg_pix, max_pix)
+    views.render_pix_tab(analytics.pix_only, analytics.pix_rank, analytics.total_pix, analytics.qtd_pix, analytics.avg_pix, analytics.max_pix, analytics.pix_daily, analytics.pix_index)
 
 with tab_subs:
     if not subs_df.empty:
         st.info("🤖 **IA Scanner:** Identifiquei estes possíveis pagamentos recorrentes (Assinaturas/Fixos).")
+        # Centavos -> reais só para exibição
+        subs_view = subs_df.rename(columns={'Centavos Médio': 'Valor Médio'})
+        subs_view['Valor Médio'] = subs_view['Valor Médio'] / 100
         st.dataframe(
-            subs_df.style.format({'Valor Médio': 'R$ {:,.2f}', 'Último Pagto': '{:%d/%m/%Y}'}),
+            subs_view.style.format({'Valor Médio': 'R$ {:,.2f}', 'Último Pagto': '{:%d/%m/%Y}', 'Confiança': '{:.0%}', 'Próxima Cobrança': '{:%d/%m/%Y}'}),
             use_container_width=True
         )
-        st.metric("Estimativa Custo Fixo Mensal", f"R$ {subs_df['Valor Médio'].abs().sum():,.2f}")
+        st.metric("Estimativa Custo Fixo Mensal", f"R$ {subs_df['Centavos Médio'].abs().sum() / 100:,.2f}")
     else:
         st.info("Nenhuma assinatura recorrente detectada com clareza ainda.")
 
 with tab_metas:
-    views.render_budget_tab(df_filtered, user_budgets, st.session_state['username'])
+    views.render_budget_tab(cube_filtered, user_budgets, st.session_state['username'])
 
 with tab_manager:
     # Gestor de Contas Manual
@@ -492,6 +526,20 @@ with tab_teach:
     with col_input:
         st.markdown("#### Nova Regra")
         new_keyword = st.text_input("Se a descrição contiver o texto:", placeholder="Ex: padaria x")
+
+        # Prévia do impacto da regra (índice de trigramas sobre o histórico)
+        if len(new_keyword.strip()) >= 3:
+            impact = search_index.get_index(st.session_state['username'], df).preview(new_keyword)
+            if impact['transacoes']:
+                st.caption(f"🔎 Esta regra capturaria **{impact['transacoes']}** transação(ões) "
+                           f"({impact['descricoes']} descrição(ões) distinta(s)), total R$ {impact['total'] / 100:,.2f}.")
+                st.dataframe(
+                    impact['categorias'].assign(Total=impact['categorias']['Total'] / 100).style.format({'Total': 'R$ {:,.2f}'}),
+                    use_container_width=True, hide_index=True
+                )
+            else:
+                st.caption("🔎 Nenhuma transação do histórico contém este texto.")
+
         new_category = st.selectbox("Classificar automaticamente como:", transform.get_categories_list(df))
         
         if st.button("Salvar Regra", type="primary"):
@@ -500,8 +548,9 @@ with tab_teach:
             else:
                 success, msg = rules_manager.save_rule(new_keyword, new_category, username=st.session_state['username'])
                 if success:
+                    # Sem limpar cache global: a versão das regras do usuário faz parte
+                    # da chave do cache, então só os dados DESTE usuário são refeitos.
                     st.success(msg)
-                    st.cache_data.clear() # Limpa cache para reler com novas regras
                 else:
                     st.error(msg)
 
@@ -520,7 +569,6 @@ with tab_teach:
                 success, msg = rules_manager.delete_rule(del_key, username=st.session_state['username'])
                 if success:
                     st.success(msg)
-                    st.cache_data.clear()
                     st.rerun()
                 else:
                     st.error(msg)
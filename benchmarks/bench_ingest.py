@@ -0,0 +1,133 @@
+"""
+Benchmark da importação de extratos: tempo, vazão (linhas/s) e pico de memória
+de cada etapa, por layout e tamanho de arquivo.
+
+Etapas medidas (arquivo gerado por generate_statements, fora da medição):
+    parse       -> load_data.process_single_file (leitura + normalização, sem categorizar)
+    categorize  -> categorizer.categorize_descriptions (a frio: sem cache de usuário e
+                   com o matcher recompilado, sem o memo de descrições já vistas)
+    load_data   -> load_data.load_data de ponta a ponta (sem cache do Streamlit, matcher a frio)
+
+O tempo é medido numa execução e o pico de memória (tracemalloc: alocações do
+Python e do numpy/pandas) numa segunda, para o rastreamento não distorcer o tempo.
+
+Uso:
+    python benchmarks/bench_ingest.py --sizes 1000 100000 1000000 --layout nubank itau
+    python benchmarks/bench_ingest.py --sizes 5000000 --no-memory --csv resultados.csv
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import categorizer
+import load_data
+from generate_statements import LAYOUTS, generate_file
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+STAGES = ['parse', 'categorize', 'load_data']
+
+
+def _upload(path):
+    """Arquivo em memória com a mesma interface do UploadedFile do Streamlit."""
+    with open(path, 'rb') as f:
+        upload = io.BytesIO(f.read())
+    upload.name = os.path.basename(path)
+    upload.size = len(upload.getbuffer())
+    return upload
+
+
+def _run_stage(stage, path, descriptions):
+    if stage == 'parse':
+        return load_data.process_single_file(_upload(path), categorize=False)
+    categorizer._compiled.cache_clear() # Matcher (e o memo dele) recriado a cada execução
+    if stage == 'categorize':
+        return categorizer.categorize_descriptions(descriptions)
+    load_data._load_data_cached.clear() # Sempre a frio
+    return load_data.load_data([_upload(path)])
+
+
+def _measure(stage, path, descriptions, memory):
+    start = time.perf_counter()
+    result = _run_stage(stage, path, descriptions)
+    seconds = time.perf_counter() - start
+    if getattr(result, 'attrs', {}).get('erro'):
+        raise RuntimeError(f"{os.path.basename(path)}: {result.attrs['erro']}")
+    del result
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        _run_stage(stage, path, descriptions)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return seconds, peak_mb
+
+
+def run(sizes, layouts, out_dir, memory=True, seed=0):
+    """Executa o benchmark e devolve uma lista de resultados (dicts)."""
+    results = []
+    for layout in layouts:
+        for n in sizes:
+            try:
+                path = generate_file(layout, n, out_dir, seed=seed)
+            except ImportError as e:
+                print(f"{layout}: ignorado ({e})")
+                break
+            size_mb = os.path.getsize(path) / 1e6
+            parsed = load_data.process_single_file(_upload(path), categorize=False)
+            descriptions = parsed['Descrição']
+            distinct = descriptions.nunique()
+            del parsed
+
+            for stage in STAGES:
+                seconds, peak_mb = _measure(stage, path, descriptions, memory)
+                results.append({
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'layout': layout,
+                    'linhas': n,
+                    'distintas': distinct,
+                    'arquivo_mb': round(size_mb, 2),
+                    'etapa': stage,
+                    'segundos': round(seconds, 4),
+                    'linhas_s': round(n / seconds) if seconds > 0 else None,
+                    'pico_mb': round(peak_mb, 1) if peak_mb is not None else None,
+                })
+                r = results[-1]
+                print(f"{layout:<12} {n:>9,} {stage:<11} {r['segundos']:>9.3f}s "
+                      f"{r['linhas_s'] or 0:>12,} linhas/s  pico {r['pico_mb'] if memory else '-':>8} MB")
+            os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da importação de extratos.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="linhas por arquivo (até 5000000)")
+    parser.add_argument('--layout', nargs='+', choices=sorted(LAYOUTS), default=sorted(LAYOUTS))
+    parser.add_argument('--no-memory', action='store_true', help="não mede pico de memória (metade do tempo)")
+    parser.add_argument('--csv', help="acrescenta os resultados neste CSV")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        results = run(args.sizes, args.layout, out_dir, memory=not args.no_memory, seed=args.seed)
+
+    if args.csv and results:
+        new_file = not os.path.exists(args.csv)
+        with open(args.csv, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            if new_file:
+                writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == '__main__':
+    main()
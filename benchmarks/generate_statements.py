@@ -0,0 +1,151 @@
+"""
+Gerador de extratos bancários sintéticos para os benchmarks de importação.
+
+Produz arquivos nos layouts que o load_data reconhece (Nubank, Mercado Pago,
+Itaú e XLSX), com separadores, encodings e convenções decimais diferentes, e
+descrições repetidas como num extrato real (poucas muito frequentes, cauda
+longa de raras, Pix com CPF mascarado, IDs de corrida/pedido).
+
+Uso:
+    python benchmarks/generate_statements.py --rows 100000 --layout nubank --out /tmp/extratos
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Layouts suportados: nome do arquivo começa pelo banco (load_data usa isso como 'Banco')
+LAYOUTS = {
+    # Nubank (conta): vírgula, UTF-8, decimal US
+    'nubank': {
+        'ext': 'csv', 'sep': ',', 'encoding': 'utf-8', 'decimal': '.', 'date_format': '%d/%m/%Y',
+        'columns': ['Data', 'Valor', 'Identificador', 'Descrição'],
+    },
+    # Mercado Pago: ponto e vírgula, UTF-8, decimal BR, resumo antes do cabeçalho
+    'mercadopago': {
+        'ext': 'csv', 'sep': ';', 'encoding': 'utf-8', 'decimal': ',', 'date_format': '%d-%m-%Y',
+        'columns': ['RELEASE_DATE', 'TRANSACTION_TYPE', 'REFERENCE_ID', 'TRANSACTION_NET_AMOUNT', 'PARTIAL_BALANCE'],
+        'preamble': ['INITIAL_BALANCE;CREDITS;DEBITS;FINAL_BALANCE', '0,00;0,00;0,00;0,00', ''],
+    },
+    # Itaú: ponto e vírgula, latin-1, decimal BR
+    'itau': {
+        'ext': 'csv', 'sep': ';', 'encoding': 'latin-1', 'decimal': ',', 'date_format': '%d/%m/%Y',
+        'columns': ['Data', 'Histórico', 'Valor'],
+    },
+    # Planilha exportada (valores numéricos)
+    'xlsx': {
+        'ext': 'xlsx', 'columns': ['Data', 'Descrição', 'Valor'],
+    },
+}
+
+PEOPLE = ['MARIA DA SILVA', 'JOAO PEREIRA', 'ANA SOUZA', 'CARLOS LIMA', 'FERNANDA COSTA',
+          'PEDRO ALVES', 'JULIANA ROCHA', 'RAFAEL GOMES', 'BEATRIZ MARTINS', 'LUCAS RIBEIRO']
+STORES = ['PADARIA PAO QUENTE', 'MERCADO BOM PRECO', 'DROGARIA SAO JOAO', 'POSTO SHELL',
+          'RESTAURANTE SABOR', 'LOJAS RENNER', 'CARREFOUR', 'PAG*JOSEDASILVA', 'MP *LOJADOZE',
+          'AM PM CONVENIENCIA', 'LIVRARIA CULTURA', 'CINEMARK']
+CITIES = ['SAO PAULO BR', 'RIO DE JANEIRO BR', 'CURITIBA PR', 'BELO HORIZONTE MG', '']
+BANKS = ['NU PAGAMENTOS - IP (0260)', 'ITAU UNIBANCO (0341)', 'BCO DO BRASIL (0001)', 'MERCADO PAGO IP (0323)']
+
+
+def _description_pool(size, rng):
+    """Descrições distintas (a frequência de cada uma vem de _sample_descriptions)."""
+    fixed = ['NETFLIX.COM', 'Spotify', 'Pagamento de fatura', 'Salario', 'Rendimento poupanca']
+    pool = list(fixed)
+    while len(pool) < size:
+        kind = rng.integers(0, 6)
+        if kind == 0:
+            pool.append(f"UBER *TRIP {rng.integers(1000, 99999)}")
+        elif kind == 1:
+            pool.append(f"IFOOD *{rng.choice(STORES)} {rng.integers(100, 9999)}")
+        elif kind == 2:
+            cpf = f"•••.{rng.integers(100, 999)}.{rng.integers(100, 999)}-••"
+            pool.append(f"Transferência enviada pelo Pix - {rng.choice(PEOPLE)} - {cpf} - {rng.choice(BANKS)}")
+        elif kind == 3:
+            pool.append(f"Transferência recebida pelo Pix - {rng.choice(PEOPLE)} - {rng.choice(BANKS)}")
+        else:
+            pool.append(f"Compra no débito - {rng.choice(STORES)} {rng.choice(CITIES)}".strip())
+    return np.array(pool[:size], dtype=object)
+
+
+def _sample_descriptions(pool, n, rng, skew=1.1):
+    """Amostra com repetição tipo Zipf: poucas descrições muito frequentes, cauda longa."""
+    weights = 1.0 / np.arange(1, len(pool) + 1) ** skew
+    return pool[rng.choice(len(pool), size=n, p=weights / weights.sum())]
+
+
+def generate_transactions(n, distinct=None, seed=0):
+    """
+    DataFrame ['Data', 'Descrição', 'Valor'] com n transações em ordem de data.
+    'distinct' é o número de descrições diferentes (padrão: cresce com n,
+    como num histórico real).
+    """
+    rng = np.random.default_rng(seed)
+    distinct = distinct or int(min(max(50, n ** 0.6), 200_000))
+    descriptions = _sample_descriptions(_description_pool(distinct, rng), n, rng)
+
+    # Entradas só onde a descrição é de entrada; o resto são saídas
+    incoming = pd.Series(descriptions).str.contains('recebida|Salario|Rendimento', regex=True).to_numpy()
+    amounts = np.round(rng.lognormal(mean=4.0, sigma=1.2, size=n), 2)
+    amounts = np.where(incoming, amounts * 5, -amounts)
+
+    days = max(30, n // 40)
+    dates = pd.Timestamp('2020-01-01') + pd.to_timedelta(np.sort(rng.integers(0, days * 1440, n)), unit='min')
+    return pd.DataFrame({'Data': dates, 'Descrição': descriptions, 'Valor': amounts})
+
+
+def _format_amounts(values, decimal):
+    text = pd.Series(values).map('{:.2f}'.format)
+    return text.str.replace('.', ',', regex=False) if decimal == ',' else text
+
+
+def write_statement(df, layout, path):
+    """Grava o DataFrame de generate_transactions no layout pedido. Retorna o caminho."""
+    spec = LAYOUTS[layout]
+    if spec['ext'] == 'xlsx':
+        # Requer openpyxl (mesma dependência do pd.read_excel na importação)
+        df.to_excel(path, index=False, columns=spec['columns'])
+        return path
+
+    dates = df['Data'].dt.strftime(spec['date_format'])
+    amounts = _format_amounts(df['Valor'], spec['decimal'])
+    ids = pd.Series(np.arange(len(df)), index=df.index).map('{:012x}'.format)
+    if layout == 'nubank':
+        out = pd.DataFrame({'Data': dates, 'Valor': amounts, 'Identificador': ids, 'Descrição': df['Descrição']})
+    elif layout == 'mercadopago':
+        balance = _format_amounts(df['Valor'].cumsum(), spec['decimal'])
+        out = pd.DataFrame({'RELEASE_DATE': dates, 'TRANSACTION_TYPE': df['Descrição'], 'REFERENCE_ID': ids,
+                            'TRANSACTION_NET_AMOUNT': amounts, 'PARTIAL_BALANCE': balance})
+    else:
+        # latin-1 não tem '•': o Itaú mascara o CPF com '*'
+        out = pd.DataFrame({'Data': dates, 'Histórico': df['Descrição'].str.replace('•', '*', regex=False), 'Valor': amounts})
+
+    with open(path, 'w', encoding=spec['encoding'], newline='') as f:
+        for line in spec.get('preamble', []):
+            f.write(line + '\n')
+        out.to_csv(f, sep=spec['sep'], index=False)
+    return path
+
+
+def generate_file(layout, n, out_dir, distinct=None, seed=0):
+    """Gera um extrato de n linhas em out_dir (nome '<layout>_<n>.<ext>')."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{layout}_{n}.{LAYOUTS[layout]['ext']}")
+    return write_statement(generate_transactions(n, distinct, seed), layout, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera extratos sintéticos para benchmarks.")
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), action='append')
+    parser.add_argument('--distinct', type=int, default=None, help="descrições distintas (padrão: ~n^0.6)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='benchmarks/data')
+    args = parser.parse_args()
+
+    for layout in args.layout or sorted(LAYOUTS):
+        print(generate_file(layout, args.rows, args.out, args.distinct, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import auth
+
+# Tabelas fixas de categorização, NA ORDEM DE PRIORIDADE.
+# Cada regra é (nome, categoria, grupos): casa quando TODOS os grupos
+# têm ao menos uma palavra-chave presente na descrição normalizada.
+KEYWORD_TABLES = [
+    # Transferências para Banco Bradesco -> Pagamento de Fatura
+    ('Bradesco', 'Pagamento de Fatura', [['bradesco'], ['transferencia', 'pix enviado', 'ted', 'doc']]),
+
+    # Conveniência (Antes de Alimentação para pegar itens específicos)
+    ('Conveniência', 'Conveniência', [['conveniencia', 'condoveniencia', 'am pm', 'am/pm', 'select', '7 eleven', '7-eleven', 'loja de conveniencia']]),
+
+    ('Transporte', 'Transporte', [['uber', '99', 'posto', 'combustivel', 'ipva', 'estacionamento', 'sem parar', 'veloe']]),
+    ('Alimentação', 'Alimentação', [['ifood', 'restaurante', 'mercado', 'market', 'padaria', 'mc donalds', 'burguer', 'sodiê', 'café', 'starbucks', 'pão de açúcar', 'carrefour', 'walmart', 'san club', 'atacadão']]),
+    ('Assinaturas/TV/Net', 'Assinaturas/TV/Net', [['netflix', 'spotify', 'amazon', 'prime', 'hbo', 'disney', 'adobe', 'apple', 'google', 'youtube', 'globoplay', 'sky', 'claro', 'vivo', 'tim', 'oi']]),
+
+    # Saúde vs Farmácia (Separado)
+    ('Farmácia', 'Farmácia', [['drogaria', 'farmacia', 'pacheco', 'raia', 'drogasil']]),
+    ('Saúde', 'Saúde', [['consultorio', 'exame', 'laboratorio', 'hospital', 'medico', 'dentista', 'psicologo']]),
+
+    ('Moradia', 'Moradia', [['aluguel', 'condominio', 'luz', 'energia', 'agua', 'gas', 'internet', 'iptu', 'seguro incendio']]),
+    ('Compras', 'Compras', [['shein', 'shopee', 'mercadolivre', 'mercado livre', 'amazon mkt', 'magalu', 'loja', 'store', 'vestuario', 'roupa', 'zara', 'renner', 'riachuelo']]),
+    ('Educação', 'Educação', [['curso', 'faculdade', 'escola', 'udemy', 'alura', 'livraria', 'papelaria']]),
+    ('Lazer', 'Lazer', [['cinema', 'teatro', 'show', 'ingresso', 'sympla', 'eventim', 'bar', 'chopp', 'cerveja']]),
+    ('Gastos Gerais', 'Gastos Gerais', [['compra', 'debito', 'cartao']]),
+
+    # --- ÁREA FINANCEIRA GENÉRICA (Deixar por último) ---
+
+    # Receita (Pix recebido entra aqui - Prioridade Alta para Entradas)
+    ('Receita', 'Receita', [['pix recebido', 'transferencia recebida', 'salario', 'provento', 'deposito', 'credit', 'resgate', 'rendimento']]),
+
+    # Pix (Saídas gerais via Pix) - Só pega se não caiu em nada específico acima
+    ('Pix Enviado', 'Pix', [['pix'], ['enviado']]),
+    ('Pix Pagamento', 'Pix', [['pix'], ['pagamento']]),
+
+    # Transferências Genéricas
+    ('Transferências', 'Transferências', [['transferencia enviada', 'ted enviado', 'doc enviado', 'pagamento']]),
+
+    # Catch-all para Pix que sobrou
+    ('Pix', 'Pix', [['pix']]),
+]
+
+DEFAULT_CATEGORY = 'Outros'
+
+# Origem gravada em cada linha: qual regra/tabela produziu a categoria
+DEFAULT_SOURCE = 'padrao'
+RULE_PREFIX = 'regra:'
+TABLE_PREFIX = 'tabela:'
+
+
+def normalize_text(desc):
+    """Remove acentos e deixa minúsculo (mesma normalização usada nas regras)."""
+    desc_clean = str(desc).lower()
+    return unicodedata.normalize('NFKD', desc_clean).encode('ASCII', 'ignore').decode('utf-8')
+
+
+def normalize_series(descriptions):
+    """Versão vetorizada de normalize_text para uma Series inteira."""
+    if isinstance(descriptions.dtype, pd.CategoricalDtype):
+        # Categórica: normaliza só o dicionário e expande pelos códigos
+        normalized = normalize_series(pd.Series(descriptions.cat.categories, dtype=object)).to_numpy(dtype=object)
+        normalized = np.append(normalized, 'nan') # Código -1 (vazio), como str(NaN)
+        return pd.Series(normalized[descriptions.cat.codes.to_numpy()], index=descriptions.index, dtype=object)
+    return (
+        descriptions.map(str)
+        .str.lower()
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore')
+        .str.decode('utf-8')
+    )
+
+
+def _trie_pattern(keywords):
+    """
+    Monta uma regex em forma de trie (autômato) para as palavras-chave.
+    Em cada posição ela captura a palavra MAIS LONGA que começa ali.
+    """
+    trie = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        terminal = '' in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            # Quantificador guloso: tenta a continuação antes de aceitar o prefixo
+            return '(?:' + body + ')?' if len(branches) == 1 else body + '?'
+        return body
+
+    return re.compile('(?=(' + build(trie) + '))')
+
+
+class CategoryMatcher:
+    """
+    Categorizador compilado: regras do usuário (Teach Mode) + tabelas fixas
+    num único autômato, construído uma vez e aplicado em lote.
+    """
+
+    def __init__(self, custom_rules=None):
+        # 0. REGRAS PERSONALIZADAS (Prioridade Máxima) + tabelas fixas, nessa ordem
+        self.rules = [(RULE_PREFIX + kw, cat, [[kw.lower()]]) for kw, cat in (custom_rules or {}).items()]
+        self.rules += [(TABLE_PREFIX + name, cat, groups) for name, cat, groups in KEYWORD_TABLES]
+
+        rules_by_kw = {}
+        for idx, (_, _, groups) in enumerate(self.rules):
+            for group in groups:
+                for kw in group:
+                    rules_by_kw.setdefault(kw, set()).add(idx)
+
+        # Palavra vazia está contida em qualquer descrição (mesmo comportamento do 'in')
+        self._always = rules_by_kw.pop('', set())
+        keywords = sorted(rules_by_kw)
+
+        # Se a palavra mais longa numa posição casou, todos os seus prefixos também casaram
+        self._implied = {kw: [k for k in keywords if kw.startswith(k)] for kw in keywords}
+        self._rules_by_kw = rules_by_kw
+        self._pattern = _trie_pattern(keywords)
+        self._memo = {}
+
+    def _resolve(self, found):
+        """Devolve o índice da regra vencedora para as palavras encontradas (ou None)."""
+        key = frozenset(found)
+        if key in self._memo:
+            return self._memo[key]
+
+        present = {''}
+        for kw in key:
+            present.update(self._implied[kw])
+
+        candidates = set(self._always)
+        for kw in present:
+            candidates.update(self._rules_by_kw.get(kw, ()))
+
+        winner = None
+        for idx in sorted(candidates):
+            if all(any(k in present for k in group) for group in self.rules[idx][2]):
+                winner = idx
+                break
+
+        self._memo[key] = winner
+        return winner
+
+    def _category(self, found):
+        idx = self._resolve(found)
+        return DEFAULT_CATEGORY if idx is None else self.rules[idx][1]
+
+    def _classify(self, found):
+        """(categoria, origem) para as palavras encontradas."""
+        idx = self._resolve(found)
+        return (DEFAULT_CATEGORY, DEFAULT_SOURCE) if idx is None else (self.rules[idx][1], self.rules[idx][0])
+
+    def categorize(self, desc):
+        """Categoriza uma única descrição."""
+        return self._category(self._pattern.findall(normalize_text(desc)))
+
+    def categorize_normalized(self, normalized):
+        """Categoriza uma Series de descrições JÁ normalizadas (normalize_series)."""
+        if len(normalized) == 0:
+            return pd.Series([], index=normalized.index, dtype=object)
+        return normalized.str.findall(self._pattern).map(self._category).astype(object)
+
+    def classify_normalized(self, normalized):
+        """Como categorize_normalized, mas devolve (categorias, origens)."""
+        pairs = normalized.str.findall(self._pattern).map(self._classify) if len(normalized) else normalized
+        categories = pd.Series([p[0] for p in pairs], index=normalized.index, dtype=object)
+        sources = pd.Series([p[1] for p in pairs], index=normalized.index, dtype=object)
+        return categories, sources
+
+    def categorize_series(self, descriptions):
+        """Categoriza uma Series inteira numa única chamada."""
+        return self.categorize_normalized(normalize_series(descriptions))
+
+
+def source_rank(sources, custom_rules=None):
+    """
+    Prioridade numérica de cada origem (menor = mais forte) sob o conjunto de regras:
+    regras do usuário na ordem do JSON, depois as tabelas fixas, depois o padrão.
+    """
+    custom_rules = custom_rules or {}
+    ranks = {RULE_PREFIX + kw: i for i, kw in enumerate(custom_rules)}
+    ranks.update({TABLE_PREFIX + name: len(custom_rules) + i for i, (name, _, _) in enumerate(KEYWORD_TABLES)})
+    lowest = len(custom_rules) + len(KEYWORD_TABLES)
+    # Uma consulta por origem DISTINTA, expandida pelos códigos.
+    # Origem de uma regra que não existe mais conta como a mais fraca
+    sources = pd.Series(sources)
+    codes, uniques = pd.factorize(sources, use_na_sentinel=False)
+    table = np.array([ranks.get(s, lowest) for s in uniques], dtype='int64')
+    return pd.Series(table[codes], index=sources.index)
+
+
+@lru_cache(maxsize=32)
+def _compiled(rules_items):
+    return CategoryMatcher(dict(rules_items))
+
+
+def get_matcher(custom_rules=None):
+    """Retorna o matcher compilado para o conjunto de regras (reaproveitado entre chamadas)."""
+    return _compiled(tuple((custom_rules or {}).items()))
+
+
+# --- CACHE PERSISTENTE (por usuário, versionado pelas regras) ---
+
+CACHE_FILENAME = "categorias_cache.json"
+CACHE_FORMAT = 2 # entradas: {descrição normalizada: [categoria, origem]}
+
+
+def rules_version(custom_rules=None):
+    """Hash do conjunto de regras ativo (a ordem importa: define a prioridade)."""
+    payload = json.dumps(list((custom_rules or {}).items()), ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _get_cache_file(username):
+    auth.init_user_env(username)
+    return os.path.join("userdata", username, CACHE_FILENAME)
+
+
+def load_cache(username, version):
+    """Carrega o cache {descrição normalizada: [categoria, origem]} se for da versão de regras atual."""
+    if not username:
+        return {}
+    cache_file = _get_cache_file(username)
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Erro ao carregar cache de categorias: {e}")
+        return {}
+    if data.get("rules_version") != version or data.get("formato") != CACHE_FORMAT:
+        return {}
+    return data.get("entries", {})
+
+
+def save_cache(username, version, entries):
+    if not username:
+        return
+    try:
+        with open(_get_cache_file(username), "w", encoding="utf-8") as f:
+            json.dump({"rules_version": version, "formato": CACHE_FORMAT, "entries": entries}, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"Erro ao salvar cache de categorias: {e}")
+
+
+def clear_cache(username):
+    """Invalida o cache do usuário (chamado quando o conjunto de regras muda)."""
+    if not username:
+        return
+    cache_file = _get_cache_file(username)
+    if os.path.exists(cache_file):
+        os.remove(cache_file)
+
+
+def categorize_descriptions(descriptions, custom_rules=None, username=None, with_source=False):
+    """
+    Categoriza uma Series de descrições rodando o matcher só nas descrições
+    DISTINTAS (normalizadas) e mapeando o resultado de volta para as linhas.
+    Descrições já vistas com o mesmo conjunto de regras vêm do cache do usuário.
+    Com with_source=True devolve (categorias, origens).
+    """
+    if len(descriptions) == 0:
+        empty = pd.Series([], index=descriptions.index, dtype=object)
+        return (empty, empty.copy()) if with_source else empty
+
+    codes, uniques = pd.factorize(descriptions, use_na_sentinel=False)
+    normalized = normalize_series(pd.Series(uniques, dtype=object))
+
+    version = rules_version(custom_rules)
+    cache = load_cache(username, version)
+
+    distinct = pd.unique(normalized)
+    missing = [d for d in distinct if d not in cache]
+    if missing:
+        categories, sources = get_matcher(custom_rules).classify_normalized(pd.Series(missing, dtype=object))
+        cache.update(zip(missing, zip(categories, sources)))
+        save_cache(username, version, cache)
+
+    pairs = normalized.map(cache)
+    categories = pd.Series(pairs.str[0].to_numpy(dtype=object)[codes], index=descriptions.index, dtype=object)
+    if not with_source:
+        return categories
+    sources = pd.Series(pairs.str[1].to_numpy(dtype=object)[codes], index=descriptions.index, dtype=object)
+    return categories, sources
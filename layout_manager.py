@@ -0,0 +1,60 @@
+import json
+import os
+import auth
+import parsers
+
+def get_layouts_file(username):
+    """Arquivo com os perfis de layout (planos de leitura) conhecidos do usuário."""
+    auth.init_user_env(username)
+    return os.path.join("userdata", username, "layouts.json")
+
+def load_layouts(username):
+    """Retorna {fingerprint: plano de leitura}."""
+    layouts_file = get_layouts_file(username)
+    
+    if not os.path.exists(layouts_file):
+        return {}
+    
+    try:
+        with open(layouts_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Erro ao carregar layouts: {e}")
+        return {}
+
+def find_layout(username, prefix):
+    """
+    Procura um perfil salvo cujo cabeçalho bate com o início do arquivo.
+    Decodifica o prefixo e compara a impressão digital da linha de cabeçalho;
+    da detecção só o encoding é refeito (barato, só o prefixo): o mesmo banco
+    pode exportar ora em cp1252, ora em UTF-8, e um prefixo com BOM ou UTF-8
+    válido vence o encoding salvo no perfil.
+    """
+    if not username or not prefix:
+        return None
+    
+    detected = parsers.detect_encoding(prefix)
+    for fingerprint, plan in load_layouts(username).items():
+        encoding = detected if detected.startswith('utf') else plan['encoding']
+        lines = parsers.prefix_lines(prefix, encoding)
+        if len(lines) <= plan['skiprows']:
+            continue
+        if parsers.header_fingerprint(lines[plan['skiprows']], plan['sep']) == fingerprint:
+            return dict(plan, encoding=encoding)
+    return None
+
+def save_layout(username, plan):
+    """Salva (ou atualiza) o perfil de layout do usuário. Ignora planos sem impressão digital."""
+    if not username or not plan or 'fingerprint' not in plan:
+        return
+    
+    layouts = load_layouts(username)
+    if layouts.get(plan['fingerprint']) == plan:
+        return
+    layouts[plan['fingerprint']] = plan
+    
+    try:
+        with open(get_layouts_file(username), "w", encoding="utf-8") as f:
+            json.dump(layouts, f, ensure_ascii=False, indent=4)
+    except Exception as e:
+        print(f"Erro ao salvar layout: {e}")
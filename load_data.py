@@ -1,87 +1,61 @@
 import streamlit as st
 import pandas as pd
-import unicodedata
 import numpy as np
+import atexit
+import io
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 import rules_manager
+import categorizer
+import merchants
+import parsers
+import layout_manager
+import transaction_store
 
 def categorize(desc, custom_rules=None):
     """
     Função auxiliar para categorizar transações com base na descrição.
     Agora aceita custom_rules: dict (keyword -> category) carregados do JSON.
+    Usa o matcher compilado (categorizer) - para Series inteiras, prefira
+    categorizer.get_matcher(custom_rules).categorize_series.
     """
-    # Remove acentos e deixa minúsculo
-    desc_clean = str(desc).lower()
-    desc_clean = unicodedata.normalize('NFKD', desc_clean).encode('ASCII', 'ignore').decode('utf-8')
-    
-    # 0. REGRAS PERSONALIZADAS (Prioridade Máxima - Teach Mode)
-    if custom_rules:
-        for keyword, category in custom_rules.items():
-            # A chave do JSON já deve estar minúscula, mas garantindo
-            if keyword.lower() in desc_clean:
-                return category
-    
-    # ... Lógica Normal (Codificada)
-    desc = desc_clean
-
-    # REGRAS ESPECÍFICAS (Hardcoded por solicitação)
-    # Transferências para Banco Bradesco -> Pagamento de Fatura
-    if 'bradesco' in desc and ('transferencia' in desc or 'pix enviado' in desc or 'ted' in desc or 'doc' in desc):
-         return 'Pagamento de Fatura'
-    
-    # Conveniência (Novo - Antes de Alimentação para pegar itens específicos)
-    if any(x in desc for x in ['conveniencia', 'condoveniencia', 'am pm', 'am/pm', 'select', '7 eleven', '7-eleven', 'loja de conveniencia']): return 'Conveniência'
-
-    if any(x in desc for x in ['uber', '99', 'posto', 'combustivel', 'ipva', 'estacionamento', 'sem parar', 'veloe']): return 'Transporte'
-    if any(x in desc for x in ['ifood', 'restaurante', 'mercado', 'market', 'padaria', 'mc donalds', 'burguer', 'sodiê', 'café', 'starbucks', 'pão de açúcar', 'carrefour', 'walmart', 'san club', 'atacadão']): return 'Alimentação'
-    if any(x in desc for x in ['netflix', 'spotify', 'amazon', 'prime', 'hbo', 'disney', 'adobe', 'apple', 'google', 'youtube', 'globoplay', 'sky', 'claro', 'vivo', 'tim', 'oi']): return 'Assinaturas/TV/Net'
-    
-    # Saúde vs Farmácia (Separado)
-    if any(x in desc for x in ['drogaria', 'farmacia', 'pacheco', 'raia', 'drogasil']): return 'Farmácia'
-    if any(x in desc for x in ['consultorio', 'exame', 'laboratorio', 'hospital', 'medico', 'dentista', 'psicologo']): return 'Saúde'
-    
-    if any(x in desc for x in ['aluguel', 'condominio', 'luz', 'energia', 'agua', 'gas', 'internet', 'iptu', 'seguro incendio']): return 'Moradia'
-    if any(x in desc for x in ['shein', 'shopee', 'mercadolivre', 'mercado livre', 'amazon mkt', 'magalu', 'loja', 'store', 'vestuario', 'roupa', 'zara', 'renner', 'riachuelo']): return 'Compras'
-    if any(x in desc for x in ['curso', 'faculdade', 'escola', 'udemy', 'alura', 'livraria', 'papelaria']): return 'Educação'
-    if any(x in desc for x in ['cinema', 'teatro', 'show', 'ingresso', 'sympla', 'eventim', 'bar', 'chopp', 'cerveja']): return 'Lazer'
-    if any(x in desc for x in ['compra', 'debito', 'cartao']): return 'Gastos Gerais'
-    
-    # --- ÁREA FINANCEIRA GÉNÉRICA (Deixar por último) ---
-    
-    # Receita (Pix recebido entra aqui - Prioridade Alta para Entradas)
-    if any(x in desc for x in ['pix recebido', 'transferencia recebida', 'salario', 'provento', 'deposito', 'credit', 'resgate', 'rendimento']): return 'Receita'
+    return categorizer.get_matcher(custom_rules).categorize(desc)
 
-    # Pix (Saídas gerais via Pix) - Só pega se não caiu em nada específico acima
-    if 'pix' in desc and 'enviado' in desc: return 'Pix' 
-    if 'pix' in desc and 'pagamento' in desc: return 'Pix'
-    
-    # Transferências Genéricas
-    if any(x in desc for x in ['transferencia enviada', 'ted enviado', 'doc enviado', 'pagamento']): return 'Transferências'
-    
-    # Catch-all para Pix que sobrou
-    if 'pix' in desc: return 'Pix'
-    
-    return 'Outros'
-
-@st.cache_data
 def load_data(uploaded_files, username=None):
     """
     Lê uma LISTA de arquivos de upload (CSV ou Excel) e retorna um DataFrame consolidado.
-    Colunas retornadas: ['Data', 'Descrição', 'Categoria', 'Valor', 'Banco']
+    Colunas retornadas (esquema compacto, ver transaction_store.compact_frame):
+    ['Data', 'Descrição', 'Comerciante', 'Beneficiario_Pix', 'Categoria', 'Origem', 'Banco',
+     'Fingerprint', 'Centavos']
     Aceita 'username' para carregar regras personalizadas e isolar dados.
+    O cache é chaveado pelo hash do conteúdo dos arquivos + versão das regras
+    DO USUÁRIO: editar uma regra só invalida as entradas de quem a editou.
     """
     
     # Se for um único arquivo (compatibilidade), transforma em lista
     if uploaded_files is not None and not isinstance(uploaded_files, list):
         uploaded_files = [uploaded_files]
-        
+    
+    digests = tuple(parsers.file_digest(f) for f in uploaded_files or [])
+    rules_version = categorizer.rules_version(rules_manager.load_rules(username))
+    return _load_data_cached(uploaded_files, username, digests, rules_version)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_data_cached(_uploaded_files, username, digests, rules_version):
+    """Corpo de load_data. Os arquivos em si ficam fora da chave (já representados por 'digests')."""
+    uploaded_files = _uploaded_files
+    
     # Carrega regras se existirem (Teach Mode) - DATA ISOLATION
     custom_rules = rules_manager.load_rules(username)
 
     if not uploaded_files:
         # DATA ISOLATION: Se estiver logado, não gera dados fake
         if username:
-            return pd.DataFrame(columns=['Data', 'Descrição', 'Categoria', 'Valor', 'Banco'])
+            return transaction_store.compact_frame(pd.DataFrame(columns=['Data', 'Descrição', 'Categoria', 'Valor', 'Banco']))
 
         # GERA DADOS FAKE DEMO (Apenas se não estiver logado)
         dates = pd.date_range(end=datetime.today(), periods=50)
@@ -97,11 +71,27 @@ def load_data(uploaded_files, username=None):
                 cat = np.random.choice(['Alimentação', 'Transporte', 'Lazer', 'Contas'])
                 desc = f"Compra {cat}"
             data.append([d, desc, cat, val, 'Demo Bank'])
-        return pd.DataFrame(data, columns=['Data', 'Descrição', 'Categoria', 'Valor', 'Banco'])
+        return transaction_store.compact_frame(pd.DataFrame(data, columns=['Data', 'Descrição', 'Categoria', 'Valor', 'Banco']))
 
     all_dfs = []
+    report = [] # Resumo por arquivo (linhas lidas, valores não reconhecidos, erros)
+    seen_digests = transaction_store.known_digests(username)
+    
+    # 1. Arquivo idêntico já importado (ou repetido neste lote)? Nem abre.
+    jobs = []
+    for file, digest in zip(uploaded_files, digests):
+        if digest in seen_digests:
+            # Sem 'hash': o manifesto já tem (ou terá, pela primeira cópia do lote)
+            report.append({'arquivo': file.name, 'hash': None, 'linhas': 0, 'falhas_valor': 0, 'repetido': True, 'erro': None})
+            continue
+        seen_digests.add(digest)
+        jobs.append((file, digest))
+    
+    # 2. Parse + normalização de todos os arquivos (em paralelo quando compensa).
+    # A ordem dos resultados é a mesma dos arquivos enviados.
+    results = _parse_files([file for file, _ in jobs], custom_rules, username)
     
-    for file in uploaded_files:
+    for (file, digest), df_temp in zip(jobs, results):
         import re
         # Identifica nome do banco pelo arquivo (ex: nubank_2023.csv -> Nubank)
         filename = file.name
@@ -109,26 +99,134 @@ def load_data(uploaded_files, username=None):
         tokens = re.split(r'[_\-\.]', filename)
         bank_name = tokens[0].title() if tokens else "Banco"
         
-        # 1. Tenta pegar pelo nome do arquivo
+        # Tenta pegar pelo nome do arquivo
         if len(bank_name) < 3: bank_name = "Banco" # Fallback
         
-        # 2. Processa arquivo
-        df_temp = process_single_file(file, custom_rules)
-
-        # 3. Se nome for genérico, tenta olhar conteúdo
+        # Se nome for genérico, usa o banco do perfil de layout ou tenta olhar conteúdo
+        plan = df_temp.attrs.get('plano', {})
         if len(bank_name) < 3 or bank_name.lower() in ['extrato', 'statement', 'relatorio', 'financeiro', 'export', 'data', 'banco']:
-             bank_name = detect_bank_from_content(df_temp, bank_name)
+             bank_name = plan.get('bank') or detect_bank_from_content(df_temp, bank_name)
+        
+        # Guarda o layout (com o banco) para pular a detecção no próximo upload
+        if username and not df_temp.empty:
+            layout_manager.save_layout(username, {**plan, 'bank': bank_name})
+        
+        # Só arquivo lido com sucesso (1+ linhas, sem erro) entra no manifesto como
+        # já importado; um que falhou precisa poder ser reenviado
+        imported = not df_temp.empty and not df_temp.attrs.get('erro')
+        report.append({
+            'arquivo': filename,
+            'hash': digest if imported else None,
+            'linhas': len(df_temp),
+            'falhas_valor': df_temp.attrs.get('falhas_valor', 0),
+            'repetido': False,
+            'erro': df_temp.attrs.get('erro'),
+        })
         
         if not df_temp.empty:
             df_temp['Banco'] = bank_name
-            all_dfs.append(df_temp)
+            # Impressão digital por arquivo (o ordinal de repetições é local ao extrato)
+            all_dfs.append(transaction_store.add_fingerprints(df_temp))
             
     if not all_dfs:
-        return pd.DataFrame()
+        empty = pd.DataFrame()
+        empty.attrs = {'arquivos': report}
+        return empty
         
-    # Consolida tudo
-    final_df = pd.concat(all_dfs, ignore_index=True)
-    return final_df.sort_values('Data')
+    # 3. Consolida tudo UMA vez (extratos com períodos sobrepostos no mesmo lote não duplicam)
+    final_df = pd.concat(all_dfs, ignore_index=True).drop_duplicates('Fingerprint')
+    
+    # 4. Categoriza o lote inteiro numa chamada (descrições distintas de todos os arquivos)
+    # (Origem registra qual regra/tabela produziu cada categoria)
+    final_df['Categoria'], final_df['Origem'] = categorizer.categorize_descriptions(final_df['Descrição'], custom_rules, username, with_source=True)
+    # Comerciante canônico e beneficiário Pix (uma vez por descrição distinta),
+    # gravados com o histórico: assinaturas e aba Pix não os recalculam
+    final_df['Comerciante'] = merchants.canonical_merchants(final_df['Descrição'])
+    final_df['Beneficiario_Pix'] = merchants.pix_beneficiaries(final_df['Descrição'])
+    
+    final_df = final_df[['Data', 'Descrição', 'Comerciante', 'Beneficiario_Pix', 'Categoria', 'Origem', 'Valor', 'Banco', 'Fingerprint']].sort_values('Data', kind='stable')
+    final_df = transaction_store.compact_frame(final_df)
+    final_df.attrs = {'arquivos': report}
+    return final_df
+
+# Acima deste volume total, vários arquivos são processados num pool de processos
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+_POOL = None
+_POOL_WORKERS = 0
+
+def _get_pool(workers):
+    """
+    Pool de processos reaproveitado entre uploads ('spawn': seguro com as threads
+    do Streamlit), com no máximo 'workers' processos; só cresce se preciso.
+    """
+    global _POOL, _POOL_WORKERS
+    if _POOL is None or _POOL_WORKERS < workers:
+        _shutdown_pool(cancel_futures=False) # Tarefas já enviadas ao pool antigo terminam
+        _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _POOL_WORKERS = workers
+    return _POOL
+
+@atexit.register
+def _shutdown_pool(cancel_futures=True):
+    """Encerra o pool (na saída do processo ou quando ele é trocado/quebra)."""
+    global _POOL, _POOL_WORKERS
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=cancel_futures)
+    _POOL, _POOL_WORKERS = None, 0
+
+def _parse_upload(name, data, custom_rules, username):
+    """Trabalho de UM arquivo, executado num processo do pool."""
+    file = io.BytesIO(data)
+    file.name = name
+    return process_single_file(file, custom_rules, username, categorize=False)
+
+def _file_error(e):
+    empty = pd.DataFrame()
+    empty.attrs['erro'] = str(e)
+    return empty
+
+def _parse_files(files, custom_rules=None, username=None):
+    """
+    Processa a lista de arquivos (sem categorizar) e devolve os DataFrames na mesma ordem.
+    Erros ficam registrados por arquivo em df.attrs['erro'].
+    """
+    total_bytes = sum(getattr(f, 'size', 0) or len(f.getvalue()) for f in files)
+    workers = min(len(files), os.cpu_count() or 1)
+    
+    if workers > 1 and total_bytes >= PARALLEL_MIN_BYTES:
+        futures = []
+        try:
+            pool = _get_pool(workers)
+            for f in files:
+                futures.append(pool.submit(_parse_upload, f.name, f.getvalue(), custom_rules, username))
+        except Exception as e:
+            print(f"Pool de processos indisponível, processando em sequência: {e}")
+            # Cancela o que ainda não começou e espera o que já está rodando:
+            # arquivo que o pool já leu não é lido de novo
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            _shutdown_pool()
+            results = []
+            for i, f in enumerate(files):
+                future = futures[i] if i < len(futures) else None
+                if future is not None and not future.cancelled() and future.exception() is None:
+                    results.append(future.result())
+                else:
+                    results.append(process_single_file(f, custom_rules, username, categorize=False))
+            return results
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as e:
+                _shutdown_pool()
+                results.append(_file_error(e))
+            except Exception as e:
+                results.append(_file_error(e))
+        return results
+    
+    return [process_single_file(f, custom_rules, username, categorize=False) for f in files]
 
 def detect_bank_from_content(df, current_name):
     """Tenta adivinhar o banco pelo conteúdo das descrições."""
@@ -147,169 +245,180 @@ def detect_bank_from_content(df, current_name):
     
     return current_name
 
-def process_single_file(file, custom_rules=None):
-    """Processa um único arquivo (lógica original extraída)."""
-    try:
-        # Verifica extensão
-        df = None
-        if file.name.lower().endswith('.csv'):
-            # 1. Detectar Encoding e Ler Linhas
-            encodings = ['utf-8', 'latin-1', 'cp1252']
-            content = None
-            used_encoding = 'utf-8'
-            
-            # Reseta e lê bytes
-            file.seek(0)
-            file_bytes = file.read()
-            
-            for enc in encodings:
-                try:
-                    content = file_bytes.decode(enc)
-                    used_encoding = enc
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if not content:
-                # st.error(f"Falha na codificação do arquivo {file.name}.")
-                return pd.DataFrame()
-            
-            lines = content.splitlines()
-            if not lines: return pd.DataFrame()
+# Linhas por bloco na leitura de CSV: o pico de memória fica proporcional a este valor
+CSV_CHUNK_ROWS = 100_000
 
-            # 2. Detectar Separador e Linha de Cabeçalho Manualmente
-            best_sep = None
-            header_row_idx = -1
-            
-            separators = [';', ',', '\t']
-            keywords = ['data', 'date', 'dt', 'release_date', 'lançamento', 'valor', 'value', 'amount', 'net_amount']
-            
-            for i, line in enumerate(lines[:50]):
-                if not line.strip(): continue
-                line_lower = line.lower()
-                
-                found_keywords = [k for k in keywords if k in line_lower]
-                if len(found_keywords) >= 2:
-                    counts = {sep: line.count(sep) for sep in separators}
-                    likely_sep = max(counts, key=counts.get)
-                    if counts[likely_sep] > 0:
-                        best_sep = likely_sep
-                        header_row_idx = i
-                        break
-            
-            if best_sep is None:
-                # Fallback
-                for i, line in enumerate(lines[:10]):
-                    if not line.strip(): continue
-                    cols_semicolon = len(line.split(';'))
-                    cols_comma = len(line.split(','))
-                    if cols_semicolon > cols_comma: best_sep = ';'; header_row_idx = i
-                    else: best_sep = ','; header_row_idx = i
-                    break
-            
-            if best_sep and header_row_idx != -1:
-                try:
-                    file.seek(0)
-                    df = pd.read_csv(
-                        file, 
-                        sep=best_sep, 
-                        skiprows=header_row_idx, 
-                        encoding=used_encoding, 
-                        on_bad_lines='skip',
-                        engine='python'
-                    )
-                except Exception as e:
-                    # st.error(f"Erro no parsing final: {e}")
-                    return pd.DataFrame()
-            else:
-                return pd.DataFrame()
-                
-        else:
-            df = pd.read_excel(file)
-        
-        # --- Normalização Financeira ---
-        
-        # 1. DATA
-        date_col = None
+def detect_columns(df):
+    """Descobre as colunas de Data, Valor e Descrição (mais formato da data e convenção decimal) numa amostra."""
+    # 1. DATA (formato exato inferido numa amostra; dayfirst só como último recurso)
+    date_col, date_format = None, None
+    name_matches = [c for c in df.columns if any(x in str(c).lower() for x in ['data', 'date', 'dt', 'release_date'])]
+    for col in name_matches + [c for c in df.columns if c not in name_matches]:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            date_col, date_format = col, None; break
+        date_format = parsers.infer_date_format(df[col].iloc[:20])
+        if date_format:
+            date_col = col; break
+    
+    if not date_col:
         for col in df.columns:
-            c_str = str(col).lower()
-            if any(x in c_str for x in ['data', 'date', 'dt', 'release_date']):
-                try:
-                    if (pd.to_datetime(df[col].iloc[:20], dayfirst=True, errors='coerce').notna().mean() > 0.8):
-                        date_col = col; break
-                except: pass
-        
-        if not date_col:
-            for col in df.columns:
-                try:
-                    if (pd.to_datetime(df[col].iloc[:20], dayfirst=True, errors='coerce').notna().mean() > 0.8):
-                        date_col = col; break
-                except: pass
+            try:
+                if (pd.to_datetime(df[col].iloc[:20], dayfirst=True, errors='coerce').notna().mean() > 0.8):
+                    date_col = col; break
+            except: pass
 
-        if date_col:
-            df['Data'] = pd.to_datetime(df[date_col], dayfirst=True, errors='coerce')
-            df = df.dropna(subset=['Data'])
-        else:
-            return pd.DataFrame()
+    if not date_col:
+        return None
 
-        # 2. VALOR
-        value_col = None
+    # 2. VALOR
+    value_col = None
+    for col in df.columns:
+        c_str = str(col).lower()
+        if any(x in c_str for x in ['valor', 'value', 'amount', 'montante', 'net_amount']):
+            value_col = col; break
+    
+    if not value_col:
         for col in df.columns:
-            c_str = str(col).lower()
-            if any(x in c_str for x in ['valor', 'value', 'amount', 'montante', 'net_amount']):
+            if col == date_col: continue
+            try: 
+                pd.to_numeric(df[col].astype(str).str.replace(',','.'), errors='raise')
                 value_col = col; break
-        
-        if not value_col:
-            for col in df.columns:
-                if col == date_col: continue
-                try: 
-                    pd.to_numeric(df[col].astype(str).str.replace(',','.'), errors='raise')
-                    value_col = col; break
-                except: pass
-        
-        if value_col:
-            # Lógica de Parsing Numérico Safer
-            def safe_parse(x):
-                s = str(x).strip().replace('R$', '').replace(' ', '')
-                if not s: return 0.0
-                
-                # Detecta formato (se tem vírgula no final como decimal)
-                # Caso Brasil: 1.000,00 -> Tem virgula nas ultimas 3 pos
-                # Caso US: 1,000.00 -> Tem ponto nas ultimas 3 pos
-                
-                try:
-                    # Tenta converter direto (se for float python puro)
-                    return float(s)
-                except:
-                    pass
-                
-                # Se tem vírgula como decimal (padrao BR)
-                if ',' in s and ('.' not in s or s.find(',') > s.find('.')):
-                     # Remove ponto de milhar e troca vírgula por ponto
-                     s_clean = s.replace('.', '').replace(',', '.')
-                     return float(s_clean)
-                
-                # Se tem ponto como decimal (padrao US)
-                if '.' in s and (',' not in s or s.find('.') > s.find(',')):
-                    # Remove vírgula de milhar
-                    s_clean = s.replace(',', '')
-                    return float(s_clean)
-                    
-                return 0.0
+            except: pass
+    
+    if not value_col:
+        return None
+
+    # 3. DESCRIÇÃO
+    desc_cols = [c for c in df.columns if any(k in str(c).lower() for k in ['desc', 'hist', 'memo', 'estabelecimento', 'type', 'transaction', 'tipo'])]
+    
+    return {
+        'date_col': date_col,
+        'date_format': date_format,
+        'value_col': value_col,
+        'desc_col': desc_cols[0] if desc_cols else None,
+        'decimal': parsers.detect_decimal(df[value_col]),
+    }
 
-            df['Valor'] = df[value_col].apply(safe_parse).fillna(0)
-        else:
-            return pd.DataFrame()
+def normalize_chunk(df, plan, custom_rules=None, username=None, categorize=True):
+    """Normaliza um bloco para ['Data', 'Descrição', 'Categoria', 'Valor']. Retorna (df, falhas de valor)."""
+    out = pd.DataFrame({'Data': parsers.parse_dates(df[plan['date_col']], plan['date_format'])})
+    keep = out['Data'].notna()
+    out = out[keep]
+    df = df[keep]
 
-        # 3. DESCRIÇÃO
-        desc_cols = [c for c in df.columns if any(k in str(c).lower() for k in ['desc', 'hist', 'memo', 'estabelecimento', 'type', 'transaction', 'tipo'])]
-        df['Descrição'] = df[desc_cols[0]] if desc_cols else "Sem descrição"
+    # Parsing vetorizado (convenção BR/US inferida uma vez para o arquivo)
+    out['Valor'], value_failures = parsers.parse_amounts(df[plan['value_col']], decimal=plan['decimal'])
+    out['Descrição'] = df[plan['desc_col']] if plan['desc_col'] is not None else "Sem descrição"
+    
+    if not categorize:
+        return out[['Data', 'Descrição', 'Valor']], value_failures
+    
+    # CATEGORIA (só nas descrições distintas, com cache persistente por usuário)
+    out['Categoria'] = categorizer.categorize_descriptions(out['Descrição'], custom_rules, username)
+    
+    return out[['Data', 'Descrição', 'Categoria', 'Valor']], value_failures
+
+def _csv_chunks(file, plan, chunksize):
+    """
+    Leitor em blocos (engine C) segundo o plano. UTF-8 é decodificado de forma
+    estrita: um prefixo só ASCII não prova o encoding do resto do arquivo.
+    """
+    file.seek(0)
+    return iter(pd.read_csv(
+        file,
+        sep=plan['sep'],
+        quotechar=plan['quotechar'],
+        skiprows=plan['skiprows'],
+        encoding=plan['encoding'],
+        encoding_errors='strict' if plan['encoding'] == 'utf-8' else 'replace',
+        on_bad_lines='skip',
+        dtype=str,
+        engine='c',
+        chunksize=chunksize
+    ))
+
+# Parte do plano que descreve as colunas (o resto é leitura: separador, encoding...)
+COLUMN_PLAN_KEYS = ['date_col', 'date_format', 'value_col', 'desc_col', 'decimal']
+
+def _plan_fits(df, plan, min_ratio=0.8, sample_size=200):
+    """
+    Confere um plano de colunas (de um perfil salvo) contra o primeiro bloco:
+    colunas presentes, maioria das datas e valores reconhecida e mesma
+    convenção decimal. Mesmo cabeçalho não garante mesmo formato.
+    """
+    if any(plan.get(k) is not None and plan[k] not in df.columns for k in ('date_col', 'value_col', 'desc_col')):
+        return False
+    sample = df.head(sample_size)
+    if sample.empty:
+        return False
+    if parsers.parse_dates(sample[plan['date_col']], plan['date_format']).notna().mean() < min_ratio:
+        return False
+    values = sample[plan['value_col']]
+    if parsers.detect_decimal(values) != plan['decimal']:
+        return False
+    _, failures = parsers.parse_amounts(values, decimal=plan['decimal'])
+    return failures <= (1 - min_ratio) * max(int(values.notna().sum()), 1)
+
+def _normalize_chunks(chunks, plan, custom_rules=None, username=None, categorize=True):
+    """Normaliza todos os blocos (colunas detectadas no primeiro valem para o arquivo)."""
+    first = next(chunks, None)
+    if first is None:
+        return _file_error("Arquivo sem linhas")
+    if 'date_col' in plan and not _plan_fits(first, plan):
+        # Perfil salvo não lê este arquivo: detecta de novo (e o perfil é atualizado ao salvar)
+        for key in COLUMN_PLAN_KEYS:
+            plan.pop(key, None)
+    if 'date_col' not in plan:
+        columns = detect_columns(first)
+        if columns is None:
+            return _file_error("Colunas de data/valor não encontradas")
+        plan.update(columns)
+    
+    parts = []
+    value_failures = 0
+    for chunk in itertools.chain([first], chunks):
+        part, failures = normalize_chunk(chunk, plan, custom_rules, username, categorize)
+        parts.append(part)
+        value_failures += failures
+    
+    result = pd.concat(parts, ignore_index=True)
+    if result.empty:
+        # 0 linhas nunca é sucesso: nenhuma data reconhecida no arquivo
+        return _file_error("Nenhuma linha com data reconhecida")
+    result.attrs['falhas_valor'] = value_failures
+    result.attrs['plano'] = plan
+    return result
+
+def process_single_file(file, custom_rules=None, username=None, chunksize=CSV_CHUNK_ROWS, categorize=True):
+    """
+    Processa um único arquivo. CSVs são lidos em blocos com o engine C,
+    normalizando e categorizando bloco a bloco (memória proporcional ao bloco).
+    Com categorize=False a coluna Categoria fica de fora (load_data categoriza
+    o lote inteiro de uma vez).
+    """
+    try:
+        # Verifica extensão
+        if not file.name.lower().endswith('.csv'):
+            return _normalize_chunks(iter([pd.read_excel(file)]), {}, custom_rules, username, categorize)
         
-        # 4. CATEGORIA
-        df['Categoria'] = df['Descrição'].apply(lambda x: categorize(x, custom_rules))
+        # Layout já conhecido do usuário? Vai direto para o parser, sem detecção.
+        plan = layout_manager.find_layout(username, parsers.read_prefix(file))
+        if plan is None:
+            # Plano de leitura detectado só no prefixo do arquivo
+            plan = parsers.sniff_csv(file)
+        if plan is None:
+            return _file_error("Cabeçalho não encontrado")
         
-        return df[['Data', 'Descrição', 'Categoria', 'Valor']].sort_values('Data')
+        try:
+            return _normalize_chunks(_csv_chunks(file, plan, chunksize), plan, custom_rules, username, categorize)
+        except UnicodeDecodeError:
+            if plan['encoding'] != 'utf-8':
+                raise
+            # Prefixo ASCII/UTF-8, mas bytes latin-1/cp1252 mais adiante: relê o
+            # arquivo inteiro como cp1252 em vez de trocar caracteres por '�'
+            plan['encoding'] = 'cp1252'
+            return _normalize_chunks(_csv_chunks(file, plan, chunksize), plan, custom_rules, username, categorize)
 
     except Exception as e:
-        # st.error(f"Erro ao processar arquivo: {e}")
-        return pd.DataFrame()
+        # Erro fica registrado para o relatório por arquivo
+        return _file_error(e)
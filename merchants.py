@@ -0,0 +1,184 @@
+import re
+
+import pandas as pd
+
+import categorizer
+
+# Canonicalização de comerciantes: descrição bruta do extrato -> identificador
+# estável do comerciante (minúsculo, sem acentos, sem ruído de processadora,
+# documento, cidade ou código). Calculado uma vez por descrição distinta.
+
+# Marcas conhecidas, NA ORDEM DE PRIORIDADE: (id, nome de exibição, padrão)
+BRANDS = [
+    ('uber', 'Uber', r'uber'),
+    ('99app', '99 App', r'(?<![\d.,])99(?![\d.,])'), # Evita '9.99'
+    ('ifood', 'iFood', r'ifood'),
+    ('rappi', 'Rappi', r'rappi'),
+    ('netflix', 'Netflix', r'netflix'),
+    ('spotify', 'Spotify', r'spotify'),
+    ('amazon', 'Amazon', r'amazon|amzn'),
+    ('apple', 'Apple', r'apple'),
+    ('google', 'Google', r'google'),
+]
+
+# Processadoras/gateways que prefixam o nome do lojista ("PAG*LOJA", "MP *LOJA")
+PROCESSOR_PREFIXES = [
+    'pagseguro', 'pag', 'pg', 'mercadopago', 'mp', 'paypal', 'ebanx', 'dlocal', 'dl',
+    'sumup', 'stone', 'cielo', 'getnet', 'pagarme', 'pagar.me', 'picpay', 'ec', 'zp',
+]
+
+# Texto padrão do banco antes do nome ("Compra no débito - LOJA", "Pix enviado - ANA")
+OPERATION_PREFIXES = [
+    r'transferencia (?:enviada|recebida)(?: (?:pelo|via) pix)?',
+    r'pix (?:enviado|enviada|recebido|recebida)',
+    r'compra (?:no |com )?(?:cartao|debito|credito)(?: de (?:debito|credito))?',
+    r'compra',
+    r'debito automatico',
+    r'pagamento de boleto',
+]
+
+UF_CODES = [
+    'ac', 'al', 'ap', 'am', 'ba', 'ce', 'df', 'es', 'go', 'ma', 'mt', 'ms', 'mg', 'pa',
+    'pb', 'pr', 'pe', 'pi', 'rj', 'rn', 'rs', 'ro', 'rr', 'sc', 'sp', 'se', 'to',
+]
+
+CITIES = [
+    'sao paulo', 'rio de janeiro', 'belo horizonte', 'brasilia', 'curitiba', 'porto alegre',
+    'salvador', 'recife', 'fortaleza', 'campinas', 'goiania', 'manaus', 'belem',
+    'florianopolis', 'vitoria', 'niteroi', 'osasco', 'barueri', 'guarulhos', 'santo andre',
+    'sao bernardo do campo', 'santos', 'sorocaba', 'ribeirao preto', 'uberlandia',
+    'joinville', 'londrina', 'natal', 'joao pessoa', 'maceio', 'teresina', 'cuiaba',
+    'campo grande', 'aracaju', 'sao luis',
+]
+
+# Comerciante usado quando a descrição é só ruído
+UNKNOWN_MERCHANT = 'outros'
+
+
+def _alternation(items, escape=True):
+    items = sorted(items, key=len, reverse=True) # Mais longo primeiro
+    return '|'.join(re.escape(i) if escape else i for i in items)
+
+
+# Compilados uma vez na importação
+_PROCESSOR = re.compile(r'^(?:' + _alternation(PROCESSOR_PREFIXES) + r')\s*\*\s*')
+_OPERATION = re.compile(r'^(?:' + _alternation(OPERATION_PREFIXES, escape=False) + r')\b\s*[-:]?\s*')
+# CPF/CNPJ, inteiros ou mascarados ("•••.654.491-••" vira ".654.491-" após normalizar),
+# e tudo o que vem depois (banco, agência e conta nos Pix)
+_DOCUMENT = re.compile(
+    r'\s*-?\s*(?:[\d*x]{0,3}\.\d{3}\.\d{3}-[\d*x]{0,2}|\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}).*$'
+)
+# Depois do nome, o que vem após " - " é banco/agência/conta/cidade ("ana souza - nu pagamentos - ip")
+_AFTER_NAME = re.compile(r'\s+-\s+.*$')
+_PLACES = _alternation(CITIES) + '|' + _alternation(UF_CODES) + r'|br|bra|brasil'
+_CODE = r'\S*\d\S*\d\S*\d\S*'
+# Ruído no fim: códigos/IDs com 3+ dígitos; cidade, UF ou país só depois de um
+# separador ("loja/sp", "loja*curitiba") ou no formato de maquininha "LOJA CIDADE [UF] BR"
+# ("drogaria sao paulo" e "banco do brasil" são nomes e ficam)
+_TRAILING = re.compile(
+    r'(?:\s*[*/#\-]+\s*(?:' + _PLACES + '|' + _CODE + r')'
+    r'|\s+' + _CODE +
+    r'|\s+(?:' + _alternation(CITIES) + r')\s+(?:' + _alternation(UF_CODES) + r')(?:\s+(?:br|bra))?'
+    r'|\s+(?:(?:' + _alternation(CITIES) + r')\s+)?(?:(?:' + _alternation(UF_CODES) + r')\s+)?(?:br|bra)'
+    r')+[\s*\-/#.]*$'
+)
+_SEPARATORS = re.compile(r'[\s*\-_/#]+')
+# Contraparte Pix (beneficiário de envios, pagador de recebimentos) numa única
+# regex (descrição em minúsculas, acentos preservados):
+#   Nubank:       "transferência enviada pelo pix - fulano - •••.123.456-•• - banco ..."
+#   Mercado Pago: "transferência pix enviada fulano de tal"
+#   Inter:        "pix enviado: "cp :12345678-fulano de tal""
+#   Genérico:     "pix enviado via pix - fulano", "pix recebido de fulano"
+# O nome termina em " - ", aspas, parênteses, CPF/CNPJ (inteiro ou mascarado) ou no
+# fim do texto; dígitos no meio do nome ficam ("99 taxi", "joao 2 irmaos ltda").
+_PIX_DOCUMENT = r'(?:[\d*x•]{0,3}\.\d{3}\.\d{3}-[\d*x•]{0,2}|\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}|\d{11}\b|\bcpf\b|\bcnpj\b)'
+_PIX_BENEFICIARY = re.compile(
+    r'^(?=.*pix).*?(?:envia|recebi)(?:da|do)'
+    r'(?:\s*(?:pelo|via)?\s*pix\b)?'
+    r'[\s\-:"]*'
+    r'(?:cp\s*:\s*\d+\s*-\s*)?'
+    r'(?:(?:para|de)\s+)?'
+    r'(?P<nome>[^"(|•]+?)'
+    r'(?=\s+-\s|\s*["(|•]|\s*' + _PIX_DOCUMENT + r'|\s*$)'
+)
+
+# Rótulo das linhas que não são Pix enviado/recebido
+PIX_OTHERS = 'Outros'
+# Rótulo dos Pix em que a descrição não traz um nome reconhecível
+PIX_UNNAMED = 'Pix sem nome'
+# Versão das colunas derivadas da descrição ('Comerciante' e 'Beneficiario_Pix'):
+# ao mudar, o armazenamento refaz as colunas nas partes gravadas
+LABELS_FORMAT = 4
+# Pertinência ao Pix, independente da extração do nome: menciona Pix e envio/recebimento
+_PIX_MEMBER = re.compile(r'^(?=.*pix).*(?:envia|recebi)(?:da|do)')
+
+_BRAND_PATTERNS = [(brand_id, re.compile(pattern)) for brand_id, _, pattern in BRANDS]
+_BRAND_NAMES = {brand_id: name for brand_id, name, _ in BRANDS}
+
+
+def canonicalize_series(descriptions):
+    """
+    Identificadores canônicos para uma Series de descrições (aplicado em lote,
+    de preferência só às descrições distintas - ver canonical_merchants).
+    """
+    text = categorizer.normalize_series(pd.Series(descriptions, dtype=object)).str.strip()
+    text = text.str.replace(_PROCESSOR, '', regex=True)
+    text = text.str.replace(_OPERATION, '', regex=True)
+    text = text.str.replace(_PROCESSOR, '', regex=True) # "Compra no débito - PAG*LOJA"
+    text = text.str.replace(_DOCUMENT, '', regex=True)
+    text = text.str.replace(_AFTER_NAME, '', regex=True)
+    text = text.str.replace(_TRAILING, '', regex=True)
+    text = text.str.replace(_SEPARATORS, ' ', regex=True).str.strip(' .-')
+
+    merchants = text.where(text.ne(''), UNKNOWN_MERCHANT)
+    # Marcas conhecidas: a primeira que casar (na ordem da tabela) vence
+    brand = pd.Series(None, index=text.index, dtype=object)
+    for brand_id, pattern in reversed(_BRAND_PATTERNS):
+        brand = brand.mask(text.str.contains(pattern), brand_id)
+    return brand.fillna(merchants).astype(object)
+
+
+def canonicalize(desc):
+    """Identificador canônico de uma única descrição."""
+    return canonicalize_series([desc]).iloc[0]
+
+
+def canonical_merchants(descriptions):
+    """
+    Coluna 'Comerciante' (categórica) para as linhas: canonicaliza só as
+    descrições DISTINTAS e expande o resultado pelos códigos.
+    """
+    codes, uniques = pd.factorize(descriptions, use_na_sentinel=False)
+    ids = canonicalize_series(pd.Series(uniques, dtype=object))
+    id_codes, id_uniques = pd.factorize(ids, use_na_sentinel=False)
+    return pd.Series(pd.Categorical.from_codes(id_codes[codes], id_uniques), index=descriptions.index)
+
+
+def merchant_name(merchant_id):
+    """Nome de exibição do comerciante (marca conhecida ou o id em formato de título)."""
+    return _BRAND_NAMES.get(merchant_id, str(merchant_id).title())
+
+
+def pix_beneficiaries(descriptions):
+    """
+    Coluna 'Beneficiario_Pix' (categórica) para as linhas, calculada sobre as
+    descrições DISTINTAS. Quem é Pix enviado ou recebido é decidido por um teste
+    próprio; o nome extraído (_PIX_BENEFICIARY) é só o rótulo, e sem nome
+    reconhecível fica PIX_UNNAMED. O que não é Pix fica como PIX_OTHERS.
+
+    >>> list(pix_beneficiaries(pd.Series([
+    ...     'Transferência enviada pelo Pix - MARIA DA SILVA - •••.123.456-••',
+    ...     'Pix enviado - 99 TAXI', 'Transferência enviada pelo Pix - JOAO 2 IRMAOS LTDA - 12.345.678/0001-90',
+    ...     'Pix enviado', 'Compra no débito - PADARIA'])))
+    ['Maria Da Silva', '99 Taxi', 'Joao 2 Irmaos Ltda', 'Pix sem nome', 'Outros']
+    """
+    codes, uniques = pd.factorize(descriptions, use_na_sentinel=False)
+    text = pd.Series(uniques, dtype=object).astype(str).str.lower()
+    is_pix = text.str.contains(_PIX_MEMBER)
+    names = (
+        text.str.extract(_PIX_BENEFICIARY, expand=False)
+        .str.strip(' -').str.title().str[:30].str.strip() # Formata Nome Próprio, limita tamanho
+    )
+    names = names.where(names.notna() & names.ne(''), PIX_UNNAMED).where(is_pix, PIX_OTHERS)
+    name_codes, name_uniques = pd.factorize(names, use_na_sentinel=False)
+    return pd.Series(pd.Categorical.from_codes(name_codes[codes], name_uniques), index=descriptions.index)
@@ -0,0 +1,290 @@
+import codecs
+import hashlib
+import re
+
+import numpy as np
+import pandas as pd
+
+# Marcadores de sinal aceitos no fim do valor: D = débito (negativo), C = crédito
+_SIGN_MARKER = re.compile(r'([DdCc])$')
+_DECIMAL_TAIL = re.compile(r'[.,]\d{1,2}$')
+
+
+def infer_decimal_separator(sample):
+    """
+    Descobre a convenção decimal da coluna a partir de uma amostra de textos
+    já limpos: ',' para o padrão BR (1.234,56) ou '.' para o US (1,234.56).
+    """
+    votes = {',': 0, '.': 0}
+    for s in sample:
+        has_comma, has_dot = ',' in s, '.' in s
+        if has_comma and has_dot:
+            # O último separador é o decimal (evidência forte)
+            votes[',' if s.rfind(',') > s.rfind('.') else '.'] += 2
+        elif has_comma or has_dot:
+            sep = ',' if has_comma else '.'
+            if s.count(sep) > 1:
+                # Repetido só pode ser milhar
+                votes['.' if sep == ',' else ','] += 2
+            elif _DECIMAL_TAIL.search(s):
+                votes[sep] += 1
+
+    if votes[','] != votes['.']:
+        return ',' if votes[','] > votes['.'] else '.'
+    # Empate: vírgula presente indica decimal BR (mesmo critério do parser antigo)
+    return ',' if any(',' in s for s in sample) else '.'
+
+
+def _clean_amounts(values):
+    """Remove 'R$', espaços e marcadores de sinal. Retorna (texto numérico, máscara negativa)."""
+    s = pd.Series(values, dtype=object).fillna('').map(str)
+    s = s.str.replace(r'R\$|\s', '', regex=True)
+
+    negative = s.str.startswith('(') & s.str.endswith(')')
+    marker = s.str.extract(_SIGN_MARKER, expand=False).str.upper()
+    negative |= marker.eq('D').fillna(False).astype(bool)
+    negative |= s.str.startswith('-') | s.str.endswith('-')
+
+    body = s.str.replace(r'^[(+\-]+|[)\-+DdCc]+$', '', regex=True)
+    return body, negative
+
+
+def detect_decimal(values, sample_size=500):
+    """Infere a convenção decimal (',' ou '.') de uma coluna de valores."""
+    if pd.api.types.is_numeric_dtype(values):
+        return '.'
+    body, _ = _clean_amounts(pd.Series(values).head(sample_size * 4))
+    return infer_decimal_separator(body[body.ne('')].head(sample_size).tolist())
+
+
+def parse_amounts(values, decimal=None, sample_size=500):
+    """
+    Converte uma coluna de valores (BR ou US) para float de forma vetorizada.
+    A convenção decimal é inferida UMA vez a partir de uma amostra (ou recebida
+    pronta em 'decimal', para reaproveitar entre blocos do mesmo arquivo).
+    Aceita 'R$', sinal negativo, parênteses e marcadores D/C no final.
+    Retorna (Series float, quantidade de células que não puderam ser lidas).
+    Células vazias viram 0.0 sem contar como falha; falhas também viram 0.0.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_numeric(values, errors='coerce').astype(float).fillna(0.0), 0
+
+    body, negative = _clean_amounts(values)
+    non_empty = body.ne('')
+    if decimal is None:
+        decimal = infer_decimal_separator(body[non_empty].head(sample_size).tolist())
+
+    if decimal == ',':
+        body = body.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    else:
+        body = body.str.replace(',', '', regex=False)
+
+    parsed = pd.to_numeric(body, errors='coerce')
+    failed = int((parsed.isna() & non_empty).sum())
+
+    result = parsed.fillna(0.0).astype(float).abs().to_numpy()
+    result = pd.Series(np.where(negative.to_numpy(), -result, result), index=body.index)
+    return result, failed
+
+
+# --- DATAS ---
+
+# Formatos testados na inferência, em ordem de preferência (dia primeiro, padrão BR)
+DATE_FORMATS = [
+    '%d/%m/%Y', '%d/%m/%y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S',
+    '%d-%m-%Y', '%d.%m.%Y', '%d-%m-%y',
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S.%f%z',
+    '%Y/%m/%d', '%Y%m%d',
+    '%m/%d/%Y', '%m/%d/%y', '%m/%d/%Y %H:%M:%S',
+]
+
+
+# Offset de fuso no fim do texto ('-03:00', '+0000', 'Z')
+_OFFSET_TAIL = re.compile(r'(?:Z|[+-]\d{2}:?\d{2})$')
+
+
+def _parse_with_format(values, date_format):
+    """
+    to_datetime com formato fixo. Com '%z' o offset é descartado antes da
+    leitura (fica o horário local informado): offsets mistos, como -03:00 e
+    -02:00 na troca do horário de verão, não abortam a coluna.
+    """
+    if '%z' in date_format:
+        values = pd.Series(values).astype(str).str.replace(_OFFSET_TAIL, '', regex=True)
+        date_format = date_format.replace('%z', '')
+    return pd.to_datetime(values, format=date_format, errors='coerce')
+
+
+def infer_date_format(values, sample_size=20, min_ratio=0.8):
+    """
+    Descobre o formato strptime exato de uma coluna de datas a partir de uma
+    amostra. Retorna o formato (ex: '%d/%m/%Y') ou None se nenhum servir.
+    """
+    sample = pd.Series(values).dropna().head(sample_size)
+    if sample.empty or pd.api.types.is_datetime64_any_dtype(sample):
+        return None
+    sample = sample.map(str)
+
+    best_fmt, best_ratio = None, 0.0
+    for fmt in DATE_FORMATS:
+        try:
+            ratio = _parse_with_format(sample, fmt).notna().mean()
+        except (ValueError, TypeError):
+            continue # Candidato que nem consegue ler a amostra não serve
+        if ratio > best_ratio:
+            best_fmt, best_ratio = fmt, ratio
+            if ratio == 1.0:
+                break
+    return best_fmt if best_ratio > min_ratio else None
+
+
+def parse_dates(values, date_format=None):
+    """
+    Converte a coluna inteira numa única passada vetorizada com formato fixo.
+    Sem formato (planilhas, formatos exóticos), cai na inferência dayfirst do pandas.
+    Datas com fuso são convertidas para o horário local informado (sem fuso).
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        parsed = values
+    elif date_format:
+        parsed = _parse_with_format(values, date_format)
+    else:
+        try:
+            parsed = pd.to_datetime(values, dayfirst=True, errors='coerce')
+        except ValueError:
+            # Fusos mistos sem formato conhecido: normaliza para UTC
+            parsed = pd.to_datetime(values, dayfirst=True, errors='coerce', utc=True)
+    if getattr(parsed.dt, 'tz', None) is not None:
+        parsed = parsed.dt.tz_localize(None)
+    return parsed
+
+
+# --- SNIFFER (só olha um prefixo do arquivo) ---
+
+# Bytes lidos para descobrir encoding, separador e cabeçalho
+SNIFF_BYTES = 64 * 1024
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+SEPARATORS = [';', ',', '\t']
+HEADER_KEYWORDS = ['data', 'date', 'dt', 'release_date', 'lançamento', 'valor', 'value', 'amount', 'net_amount']
+
+
+def detect_encoding(prefix):
+    """
+    Detecta o encoding a partir dos bytes iniciais (BOM, UTF-8 válido, cp1252/latin-1).
+    Prefixo só ASCII é ambíguo: devolve 'utf-8', que a leitura decodifica de
+    forma estrita e troca por cp1252 se aparecer um byte inválido adiante.
+    """
+    for bom, enc in _BOMS:
+        if prefix.startswith(bom):
+            return enc
+
+    try:
+        # final=False: um caractere multibyte cortado no fim do prefixo não é erro
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    # 0x80-0x9F são controles no latin-1 mas caracteres (€, “, ”, –) no cp1252
+    high_controls = {b for b in prefix if 0x80 <= b <= 0x9F}
+    if high_controls and not high_controls & {0x81, 0x8D, 0x8F, 0x90, 0x9D}:
+        return 'cp1252'
+    return 'latin-1'
+
+
+def detect_header(lines):
+    """Encontra (separador, índice da linha de cabeçalho) nas primeiras linhas."""
+    for i, line in enumerate(lines[:50]):
+        if not line.strip(): continue
+        line_lower = line.lower()
+
+        found_keywords = [k for k in HEADER_KEYWORDS if k in line_lower]
+        if len(found_keywords) >= 2:
+            counts = {sep: line.count(sep) for sep in SEPARATORS}
+            likely_sep = max(counts, key=counts.get)
+            if counts[likely_sep] > 0:
+                return likely_sep, i
+
+    # Fallback: primeira linha não vazia, ';' ou ','
+    for i, line in enumerate(lines[:10]):
+        if not line.strip(): continue
+        cols_semicolon = len(line.split(';'))
+        cols_comma = len(line.split(','))
+        return (';' if cols_semicolon > cols_comma else ','), i
+
+    return None, -1
+
+
+def detect_quotechar(lines, sep):
+    """Aspas usadas para delimitar campos (padrão: aspas duplas)."""
+    text = '\n'.join(lines)
+    single = text.count(sep + "'") + text.count("'" + sep)
+    double = text.count(sep + '"') + text.count('"' + sep)
+    return "'" if single > double else '"'
+
+
+def file_digest(file, block_size=1024 * 1024):
+    """SHA-256 do conteúdo do arquivo (lido em blocos; cursor volta ao início)."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(block_size), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def read_prefix(file, prefix_bytes=SNIFF_BYTES):
+    """Lê só o início do arquivo (e volta o cursor para o começo)."""
+    file.seek(0)
+    prefix = file.read(prefix_bytes)
+    file.seek(0)
+    return prefix
+
+
+def prefix_lines(prefix, encoding, prefix_bytes=SNIFF_BYTES):
+    """Linhas completas contidas no prefixo."""
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(prefix, final=False)
+    lines = text.splitlines()
+    if len(prefix) == prefix_bytes and len(lines) > 1:
+        lines = lines[:-1] # Última linha pode estar cortada
+    return lines
+
+
+def header_fingerprint(header_line, sep):
+    """Impressão digital do layout: cabeçalho normalizado + separador."""
+    normalized = ' '.join(header_line.strip().lower().split())
+    return hashlib.sha1(f"{sep}|{normalized}".encode('utf-8')).hexdigest()
+
+
+def sniff_csv(file, prefix_bytes=SNIFF_BYTES):
+    """
+    Lê apenas um prefixo limitado do arquivo e monta o "plano de leitura":
+    {'encoding', 'sep', 'quotechar', 'skiprows', 'fingerprint'}. Retorna None
+    se não achar cabeçalho. O custo não depende do tamanho do arquivo.
+    """
+    prefix = read_prefix(file, prefix_bytes)
+    if not prefix:
+        return None
+
+    encoding = detect_encoding(prefix)
+    lines = prefix_lines(prefix, encoding, prefix_bytes)
+
+    sep, header_row_idx = detect_header(lines)
+    if sep is None:
+        return None
+
+    return {
+        'encoding': encoding,
+        'sep': sep,
+        'quotechar': detect_quotechar(lines[header_row_idx:], sep),
+        'skiprows': header_row_idx,
+        'fingerprint': header_fingerprint(lines[header_row_idx], sep),
+    }
@@ -1,6 +1,7 @@
 import json
 import os
 import auth
+import categorizer
 
 def get_rules_file(username):
     if not username:
@@ -28,6 +29,7 @@ def save_rule(keyword, category, username=None):
     """Salva regra para o usuário."""
     rules = load_rules(username)
     k = keyword.lower().strip()
+    changed = rules.get(k) != category
     rules[k] = category
     
     rules_file = get_rules_file(username)
@@ -35,6 +37,8 @@ def save_rule(keyword, category, username=None):
     try:
         with open(rules_file, "w", encoding="utf-8") as f:
             json.dump(rules, f, ensure_ascii=False, indent=4)
+        if changed:
+            categorizer.clear_cache(username) # Conjunto de regras mudou
         return True, f"Regra salva: '{keyword}' -> '{category}'"
     except Exception as e:
         return False, f"Erro ao salvar regra: {str(e)}"
@@ -50,6 +54,7 @@ def delete_rule(keyword, username=None):
         try:
             with open(rules_file, "w", encoding="utf-8") as f:
                 json.dump(rules, f, ensure_ascii=False, indent=4)
+            categorizer.clear_cache(username)
             return True, f"Regra removida: '{keyword}'"
         except Exception as e:
             return False, f"Erro ao salvar após remocao: {str(e)}"
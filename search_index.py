@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import categorizer
+import transaction_store
+
+# Tamanho dos n-gramas do índice (trigramas)
+NGRAM = 3
+
+
+def _ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class DescriptionIndex:
+    """
+    Índice invertido de trigramas sobre as descrições DISTINTAS (normalizadas)
+    do histórico. Cada trigrama aponta para os ids das descrições que o contêm;
+    uma busca por substring intersecta as listas e só confere o texto dos
+    candidatos. Contagens e totais ficam pré-agregados por (descrição, categoria).
+    """
+
+    def __init__(self, df):
+        codes, uniques = pd.factorize(categorizer.normalize_series(df['Descrição']), use_na_sentinel=False)
+        self.texts = list(uniques)
+
+        postings = {}
+        for i, text in enumerate(self.texts):
+            for gram in _ngrams(text):
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+        # Agregado por (descrição, categoria): a busca nunca volta às linhas
+        cat_codes, categories = pd.factorize(df['Categoria'].astype(object), use_na_sentinel=False)
+        self.categories = np.asarray(categories, dtype=object)
+        pairs = pd.DataFrame({
+            'desc': codes,
+            'cat': cat_codes,
+            'centavos': df['Centavos'].to_numpy(dtype='int64'),
+        })
+        agg = pairs.groupby(['desc', 'cat'], sort=False)['centavos'].agg(['size', 'sum']).reset_index()
+        self.pair_desc = agg['desc'].to_numpy()
+        self.pair_cat = agg['cat'].to_numpy()
+        self.pair_count = agg['size'].to_numpy()
+        self.pair_total = agg['sum'].to_numpy()
+
+    def find(self, keyword):
+        """Ids das descrições distintas que contêm 'keyword' (mesmo critério das regras)."""
+        keyword = keyword.lower().strip()
+        if not keyword:
+            return np.array([], dtype=np.int32)
+
+        if len(keyword) < NGRAM:
+            return np.array([i for i, text in enumerate(self.texts) if keyword in text], dtype=np.int32)
+
+        lists = []
+        for gram in _ngrams(keyword):
+            ids = self.postings.get(gram)
+            if ids is None:
+                return np.array([], dtype=np.int32)
+            lists.append(ids)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            if len(candidates) == 0:
+                break
+
+        if len(keyword) == NGRAM:
+            return candidates # A lista do trigrama já é exata
+        texts = self.texts
+        return np.array([i for i in candidates.tolist() if keyword in texts[i]], dtype=np.int32)
+
+    def preview(self, keyword):
+        """
+        Impacto de uma regra candidata:
+        {'transacoes': int, 'descricoes': int, 'total': centavos,
+         'categorias': DataFrame[Categoria, Transações, Total (centavos)]}.
+        """
+        ids = self.find(keyword)
+        selected = np.zeros(len(self.texts), dtype=bool)
+        selected[ids] = True
+        rows = selected[self.pair_desc]
+
+        n_cats = len(self.categories)
+        counts = np.bincount(self.pair_cat[rows], weights=self.pair_count[rows], minlength=n_cats).astype('int64')
+        totals = np.bincount(self.pair_cat[rows], weights=self.pair_total[rows], minlength=n_cats).round().astype('int64')
+        hit = counts > 0
+        by_cat = pd.DataFrame({
+            'Categoria': self.categories[hit],
+            'Transações': counts[hit],
+            'Total': totals[hit],
+        }).sort_values('Transações', ascending=False, ignore_index=True)
+
+        return {
+            'transacoes': int(counts.sum()),
+            'descricoes': len(ids),
+            'total': int(totals.sum()),
+            'categorias': by_cat,
+        }
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _build_index(username, versao):
+    """Índice do armazenamento do usuário. 'versao' invalida ao gravar/recategorizar."""
+    df = transaction_store.load_transactions(username, ('Descrição', 'Categoria', 'Centavos'))
+    return DescriptionIndex(df)
+
+
+def get_index(username, df=None):
+    """
+    Índice de descrições do usuário (reaproveitado entre interações).
+    Sem usuário (modo demonstração), indexa o DataFrame informado.
+    """
+    if not username:
+        return DescriptionIndex(df if df is not None else pd.DataFrame({'Descrição': [], 'Categoria': [], 'Centavos': pd.Series([], dtype='int64')}))
+    return _build_index(username, transaction_store.load_manifest(username)['versao'])
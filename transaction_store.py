@@ -0,0 +1,570 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+
+import auth
+import categorizer
+import merchants
+import rules_manager
+import transform
+
+# Armazenamento colunar (Parquet) por usuário:
+#   userdata/<user>/transacoes/part-*.parquet  -> um arquivo por upload (append)
+#   userdata/<user>/transacoes/manifest.json   -> partes, versão do dataset e das regras
+#   userdata/<user>/transacoes/cubo.parquet     -> cubo diário (dia x banco x categoria)
+#   userdata/<user>/transacoes/pix.parquet      -> índice de contrapartes Pix (dia x banco x categoria x pessoa)
+#   userdata/<user>/transacoes/descricoes.parquet -> (parte, descrição normalizada, origem) distintos
+COLUMNS = ['Data', 'Descrição', 'Comerciante', 'Beneficiario_Pix', 'Categoria', 'Origem', 'Centavos', 'Banco', 'Fingerprint']
+
+# Versão da impressão digital (add_fingerprints): ao mudar, as partes gravadas são refeitas
+FINGERPRINT_FORMAT = 2
+
+CUBE_FILE = "cubo.parquet"
+PIX_INDEX_FILE = "pix.parquet"
+DESCRIPTIONS_FILE = "descricoes.parquet"
+
+# Esquema compacto do histórico em memória: textos repetidos viram
+# categóricos (dicionário + códigos) e o valor fica em centavos inteiros
+CATEGORICAL_COLUMNS = ['Descrição', 'Comerciante', 'Beneficiario_Pix', 'Categoria', 'Origem', 'Banco']
+
+def to_cents(values):
+    """Valores em reais (float) -> centavos exatos (int64)."""
+    return (pd.Series(values, dtype=float) * 100).round().astype('int64')
+
+def compact_frame(df):
+    """
+    Aplica o esquema canônico (no próprio DataFrame): Data datetime64,
+    textos (Descrição, Comerciante, Beneficiario_Pix, Categoria, Origem, Banco)
+    categóricos e Centavos int64.
+    Um 'Valor' em reais (float) de entrada é convertido e removido:
+    reais só existem nas telas.
+    """
+    if 'Data' in df.columns:
+        df['Data'] = pd.to_datetime(df['Data'])
+    if 'Valor' in df.columns:
+        if 'Centavos' not in df.columns:
+            df['Centavos'] = to_cents(df['Valor']).to_numpy()
+        df.drop(columns='Valor', inplace=True)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+def add_fingerprints(df):
+    """
+    Impressão digital estável por transação: (dia, valor em centavos, descrição
+    normalizada, banco, ordinal entre repetições idênticas no mesmo dia).
+    Deve ser chamada por arquivo de origem, para que o ordinal se repita
+    quando o mesmo extrato (ou um período sobreposto) for reenviado.
+    """
+    key = pd.DataFrame({
+        # Dias desde 1970: independe da unidade do datetime64 (ns no pandas 2, us no 3)
+        'dia': df['Data'].to_numpy().astype('datetime64[D]').astype('int64'),
+        'centavos': df['Centavos'] if 'Centavos' in df.columns else to_cents(df['Valor']).to_numpy(),
+        'descricao': categorizer.normalize_series(df['Descrição']).astype(object),
+        'banco': df['Banco'].astype(str).astype(object),
+    }, index=df.index)
+    key['ordinal'] = key.groupby(['dia', 'centavos', 'descricao', 'banco'], sort=False).cumcount()
+    df['Fingerprint'] = pd.util.hash_pandas_object(key, index=False).to_numpy()
+    return df
+
+def get_store_dir(username):
+    auth.init_user_env(username)
+    path = os.path.join("userdata", username, "transacoes")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def load_manifest(username):
+    """
+    Retorna {'versao': int, 'rules_version': str, 'rules': {...}, 'labels_format': int,
+    'fingerprint_format': int, 'partes': [...], 'arquivos': [hashes]}.
+    'rules' é a cópia das regras usadas na categorização gravada (base do recálculo incremental);
+    'labels_format' é a versão (merchants.LABELS_FORMAT) com que 'Comerciante' e 'Beneficiario_Pix' foram gravadas;
+    'fingerprint_format' é a versão (FINGERPRINT_FORMAT) das impressões digitais gravadas.
+    """
+    manifest_file = os.path.join(get_store_dir(username), "manifest.json")
+    manifest = {'versao': 0, 'rules_version': None, 'rules': None, 'labels_format': None, 'fingerprint_format': None, 'partes': [], 'arquivos': []}
+    if not os.path.exists(manifest_file):
+        return manifest
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest.update(json.load(f))
+    except (OSError, ValueError) as e:
+        # Nunca recomeça do zero: o próximo append gravaria um manifesto vazio
+        # por cima e o histórico inteiro ficaria órfão
+        raise RuntimeError(f"Manifesto de transações ilegível ({manifest_file}): {e}") from e
+    return manifest
+
+def known_digests(username):
+    """Hashes (SHA-256) dos arquivos já importados pelo usuário."""
+    if not username:
+        return set()
+    return set(load_manifest(username)['arquivos'])
+
+def _atomic_write(path, write):
+    """
+    Grava via arquivo temporário no mesmo diretório + os.replace: uma queda no
+    meio da gravação deixa o arquivo anterior intacto, nunca um truncado.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _save_manifest(username, manifest):
+    manifest_file = os.path.join(get_store_dir(username), "manifest.json")
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+    _atomic_write(manifest_file, write)
+
+def _write_parquet(df, path):
+    _atomic_write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False, compression='zstd'))
+
+def _write_part(username, df, part_name=None):
+    part_name = part_name or f"part-{uuid.uuid4().hex[:12]}.parquet"
+    _write_parquet(df[COLUMNS], os.path.join(get_store_dir(username), part_name))
+    return part_name
+
+def append_transactions(username, df, digests=()):
+    """
+    Grava um lote de transações já processadas como nova parte do armazenamento.
+    Só entram linhas cuja impressão digital ainda não existe (anti-join vetorizado),
+    então reenviar extratos com períodos sobrepostos não duplica nada.
+    Retorna a quantidade de transações novas gravadas.
+    """
+    if not username or df is None or df.empty:
+        return 0
+
+    manifest = load_manifest(username)
+    custom_rules = rules_manager.load_rules(username)
+    if not manifest['partes']:
+        manifest['rules'] = custom_rules
+        manifest['rules_version'] = categorizer.rules_version(custom_rules)
+        manifest['labels_format'] = merchants.LABELS_FORMAT
+        manifest['fingerprint_format'] = FINGERPRINT_FORMAT
+    elif _needs_recategorize(manifest, custom_rules):
+        # Regras mudaram desde a última gravação: alinha o que já está salvo antes
+        manifest = _recategorize(username, manifest)
+
+    if 'Centavos' not in df.columns:
+        df = compact_frame(df.copy())
+    if 'Fingerprint' not in df.columns:
+        df = add_fingerprints(df.copy())
+    if 'Comerciante' not in df.columns:
+        df = df.assign(Comerciante=merchants.canonical_merchants(df['Descrição']))
+    if 'Beneficiario_Pix' not in df.columns:
+        df = df.assign(Beneficiario_Pix=merchants.pix_beneficiaries(df['Descrição']))
+    existing = _read_store(username, manifest['versao'], ('Fingerprint',))['Fingerprint']
+    new_rows = df[~df['Fingerprint'].isin(existing)].drop_duplicates('Fingerprint')
+
+    if not new_rows.empty:
+        descriptions = _read_descriptions(username, manifest)
+        part_name = _write_part(username, new_rows)
+        manifest['partes'].append(part_name)
+        _write_descriptions(username, pd.concat([descriptions, _description_pairs(new_rows, part_name)], ignore_index=True))
+        # Cubo diário: soma só a contribuição das linhas novas
+        cube = _read_cube_file(username)
+        if cube is None:
+            _rebuild_cube(username, manifest)
+        else:
+            _write_cube(username, transform.merge_cubes(cube, transform.build_daily_cube(new_rows)))
+        # Índice Pix: idem, só as contrapartes das linhas novas
+        pix_index = _read_pix_index_file(username)
+        if pix_index is None:
+            _rebuild_pix_index(username, manifest)
+        else:
+            _write_pix_index(username, transform.merge_pix_indexes(pix_index, transform.build_pix_index(new_rows)))
+    manifest['arquivos'] = sorted(set(manifest['arquivos']) | set(digests))
+    manifest['versao'] += 1
+    _save_manifest(username, manifest)
+    return len(new_rows)
+
+def _needs_recategorize(manifest, custom_rules):
+    return bool(manifest['partes']) and (
+        manifest.get('rules') is None
+        or manifest['rules_version'] != categorizer.rules_version(custom_rules)
+        or _derived_stale(manifest)
+    )
+
+def _rule_diff(old_rules, new_rules):
+    """
+    Diferença entre dois conjuntos de regras: (adicionadas, alteradas, removidas).
+    Retorna None se a ordem relativa das regras mantidas mudou (exige recálculo completo).
+    """
+    if old_rules is None:
+        return None
+    kept_old = [k for k in old_rules if k in new_rules]
+    kept_new = [k for k in new_rules if k in old_rules]
+    if kept_old != kept_new:
+        return None
+    added = [k for k in new_rules if k not in old_rules]
+    changed = [k for k in kept_new if old_rules[k] != new_rules[k]]
+    removed = [k for k in old_rules if k not in new_rules]
+    return added, changed, removed
+
+def _rule_diff_mask(normalized, origins, diff, custom_rules):
+    """
+    Pares (descrição normalizada, origem) que a mudança de regras pode alterar.
+    Roda sobre a tabela de descrições distintas (descricoes.parquet), não sobre
+    as partes: as que não têm nenhum par afetado nem são lidas.
+    """
+    added, changed, removed = diff
+    mask = origins.isin([categorizer.RULE_PREFIX + k for k in removed + changed]).to_numpy()
+    if added:
+        # Busca da palavra só nos textos distintos
+        codes, uniques = pd.factorize(normalized, use_na_sentinel=False)
+        texts = pd.Series(uniques, dtype=object)
+        rank = categorizer.source_rank(origins, custom_rules).to_numpy()
+        positions = {k: i for i, k in enumerate(custom_rules)}
+        for k in added:
+            contains = texts.str.contains(k.lower(), regex=False).to_numpy(dtype=bool)[codes]
+            mask = mask | (contains & (rank > positions[k]))
+    return mask
+
+def _apply_rule_diff(part, diff, custom_rules, username):
+    """
+    Atualiza só as linhas afetadas pela mudança de regras. Retorna True se algo mudou.
+    - removida: reavalia (com as regras novas) apenas as linhas que ela classificou;
+    - alterada: troca a categoria das linhas atribuídas a ela;
+    - adicionada: assume as linhas que contêm a palavra e cuja origem atual é mais fraca.
+    """
+    added, changed, removed = diff
+    touched = False
+    
+    if removed:
+        mask = part['Origem'].isin([categorizer.RULE_PREFIX + k for k in removed]).to_numpy()
+        if mask.any():
+            cats, srcs = categorizer.categorize_descriptions(part.loc[mask, 'Descrição'], custom_rules, username, with_source=True)
+            part.loc[mask, 'Categoria'] = cats
+            part.loc[mask, 'Origem'] = srcs
+            touched = True
+    
+    for k in changed:
+        mask = (part['Origem'] == categorizer.RULE_PREFIX + k).to_numpy()
+        if mask.any():
+            part.loc[mask, 'Categoria'] = custom_rules[k]
+            touched = True
+    
+    if added:
+        # Busca da palavra só nas descrições distintas
+        codes, uniques = pd.factorize(part['Descrição'], use_na_sentinel=False)
+        normalized = categorizer.normalize_series(pd.Series(uniques, dtype=object))
+        rank = categorizer.source_rank(part['Origem'], custom_rules).to_numpy(copy=True)
+        positions = {k: i for i, k in enumerate(custom_rules)}
+        for k in sorted(added, key=positions.get):
+            contains = normalized.str.contains(k.lower(), regex=False).to_numpy(dtype=bool)[codes]
+            mask = contains & (rank > positions[k])
+            if mask.any():
+                part.loc[mask, 'Categoria'] = custom_rules[k]
+                part.loc[mask, 'Origem'] = categorizer.RULE_PREFIX + k
+                rank[mask] = positions[k]
+                touched = True
+    
+    return touched
+
+def _recategorize(username, manifest):
+    """
+    Alinha as partes gravadas com as regras atuais. Quando a mudança é uma
+    adição/alteração/remoção de regras, só as partes com linhas afetadas
+    (achadas na tabela de descrições distintas) são lidas, recalculadas e
+    regravadas, e o cubo e o índice Pix recebem só a diferença delas;
+    senão, recategoriza tudo.
+    """
+    custom_rules = rules_manager.load_rules(username)
+    diff = _rule_diff(manifest.get('rules'), custom_rules)
+    if _derived_stale(manifest):
+        _relabel(username, manifest)
+    # Cubo e índice Pix só são lidos se alguma parte mudar
+    has_cube = os.path.exists(_cube_path(username))
+    has_pix_index = os.path.exists(_pix_index_path(username))
+    store_dir = get_store_dir(username)
+    deltas, pix_before, pix_after = [], [], [] # Contribuições antigas e novas das linhas que mudaram de categoria
+    descriptions = _read_descriptions(username, manifest)
+    if diff is not None:
+        hit = _rule_diff_mask(descriptions['Normalizada'], descriptions['Origem'], diff, custom_rules)
+        affected = set(descriptions['Parte'].to_numpy()[hit])
+    new_pairs = {} # Parte regravada -> pares novos (a origem mudou)
+    
+    for part_name in manifest['partes']:
+        path = os.path.join(store_dir, part_name)
+        if diff is not None and part_name not in affected:
+            continue
+        part = _read_part(path, COLUMNS).astype({'Categoria': object, 'Origem': object})
+        old_categories = part['Categoria'].to_numpy(copy=True)
+        if diff is None:
+            part['Categoria'], part['Origem'] = categorizer.categorize_descriptions(part['Descrição'], custom_rules, username, with_source=True)
+        elif not _apply_rule_diff(part, diff, custom_rules, username):
+            continue
+        _write_part(username, part, part_name)
+        new_pairs[part_name] = _description_pairs(part, part_name)
+        # Cubo e índice Pix só dependem da categoria: trocam apenas as linhas que mudaram
+        moved = part['Categoria'].to_numpy() != old_categories
+        if not moved.any():
+            continue
+        after = part[moved]
+        before = after.assign(Categoria=old_categories[moved])
+        if has_cube:
+            deltas += [transform.negate_cube(transform.build_daily_cube(before)), transform.build_daily_cube(after)]
+        if has_pix_index:
+            pix_before.append(transform.build_pix_index(before))
+            pix_after.append(transform.build_pix_index(after))
+
+    if new_pairs:
+        kept = descriptions[~descriptions['Parte'].isin(list(new_pairs)).to_numpy()]
+        _write_descriptions(username, pd.concat([kept, *new_pairs.values()], ignore_index=True))
+    if not has_cube:
+        _rebuild_cube(username, manifest)
+    elif deltas:
+        _write_cube(username, transform.merge_cubes(_read_cube_file(username), *deltas))
+    if not has_pix_index:
+        _rebuild_pix_index(username, manifest)
+    elif pix_before:
+        _write_pix_index(username, _replace_pix_contributions(username, manifest, _read_pix_index_file(username), pix_before, pix_after))
+    manifest['rules'] = custom_rules
+    manifest['rules_version'] = categorizer.rules_version(custom_rules)
+    manifest['versao'] += 1
+    _save_manifest(username, manifest)
+    return manifest
+
+def _derived_stale(manifest):
+    return (
+        manifest.get('labels_format') != merchants.LABELS_FORMAT
+        or manifest.get('fingerprint_format') != FINGERPRINT_FORMAT
+    )
+
+def _relabel(username, manifest):
+    """
+    Refaz nas partes gravadas as colunas derivadas de versão anterior:
+    'Comerciante' e 'Beneficiario_Pix' (e o índice Pix) e/ou 'Fingerprint'
+    (ordinal recontado por parte: o arquivo de origem não é mais conhecido).
+    """
+    labels = manifest.get('labels_format') != merchants.LABELS_FORMAT
+    fingerprints = manifest.get('fingerprint_format') != FINGERPRINT_FORMAT
+    store_dir = get_store_dir(username)
+    for part_name in manifest['partes']:
+        part = _read_part(os.path.join(store_dir, part_name), COLUMNS)
+        if labels:
+            part['Comerciante'] = merchants.canonical_merchants(part['Descrição'])
+            part['Beneficiario_Pix'] = merchants.pix_beneficiaries(part['Descrição'])
+        if fingerprints:
+            part = add_fingerprints(part)
+        _write_part(username, part, part_name)
+    if labels:
+        _rebuild_pix_index(username, manifest)
+    manifest['labels_format'] = merchants.LABELS_FORMAT
+    manifest['fingerprint_format'] = FINGERPRINT_FORMAT
+
+def _pix_keys(index):
+    return pd.MultiIndex.from_frame(index[transform.PIX_KEYS].astype({col: object for col in transform.PIX_KEYS[1:]}))
+
+def _replace_pix_contributions(username, manifest, pix_index, before, after):
+    """
+    Troca no índice Pix a contribuição antiga das linhas recategorizadas pela
+    nova: somas e contagens por subtração. O maior envio só é recalculado nos
+    grupos em que o valor removido era o máximo e ainda restam envios (caso
+    raro: lê as colunas do índice das partes, já regravadas).
+    """
+    removed = transform.merge_pix_indexes(*before)
+    merged = transform.merge_pix_indexes(pix_index, transform.negate_pix_index(removed), *after)
+
+    old_max = pd.Series(pix_index['Maior Envio'].to_numpy(), index=_pix_keys(pix_index))
+    removed_max = pd.Series(removed['Maior Envio'].to_numpy(), index=_pix_keys(removed))
+    lost = removed_max[(removed_max.to_numpy() > 0) & (removed_max.to_numpy() == old_max.reindex(removed_max.index).to_numpy())].index
+    merged_keys = _pix_keys(merged)
+    stale = merged_keys.isin(lost) & (merged['Qtd Enviado'].to_numpy() > 0)
+    if not stale.any():
+        return merged
+
+    stale_keys = merged_keys[stale]
+    columns = ['Data', 'Banco', 'Categoria', 'Beneficiario_Pix', 'Centavos']
+    store_dir = get_store_dir(username)
+    maxima = []
+    for p in manifest['partes']:
+        index = transform.build_pix_index(compact_frame(_read_part(os.path.join(store_dir, p), columns)))
+        keys = _pix_keys(index)
+        hit = keys.isin(stale_keys)
+        maxima.append(pd.Series(index['Maior Envio'].to_numpy()[hit], index=keys[hit]))
+    maxima = pd.concat(maxima).groupby(level=list(range(len(transform.PIX_KEYS)))).max()
+    merged.loc[stale, 'Maior Envio'] = maxima.reindex(stale_keys).fillna(0).to_numpy(dtype='int64')
+    return merged
+
+def _read_part(path, columns):
+    """Lê só as colunas pedidas de uma parte (projeção)."""
+    available = pq.read_schema(path).names
+    if any(c not in available for c in columns):
+        # Parte gravada num formato anterior: completa as colunas que faltam
+        part = pd.read_parquet(path)
+        if 'Centavos' not in part.columns:
+            part['Centavos'] = to_cents(part['Valor']).to_numpy()
+        if 'Fingerprint' not in part.columns:
+            part = add_fingerprints(part)
+        if 'Comerciante' not in part.columns:
+            part['Comerciante'] = merchants.canonical_merchants(part['Descrição'])
+        if 'Beneficiario_Pix' not in part.columns:
+            part['Beneficiario_Pix'] = merchants.pix_beneficiaries(part['Descrição'])
+        if 'Origem' not in part.columns:
+            part['Origem'] = None # Preenchida no recálculo completo (manifesto sem 'rules')
+        return part[list(columns)]
+    return pd.read_parquet(path, columns=list(columns))
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _read_store(username, versao, columns):
+    """Lê as partes com projeção de colunas. 'versao' entra na chave do cache."""
+    store_dir = get_store_dir(username)
+    parts = [_read_part(os.path.join(store_dir, p), columns) for p in load_manifest(username)['partes']]
+    if not parts:
+        return compact_frame(pd.DataFrame(columns=list(columns)))
+    df = pd.concat(parts, ignore_index=True)
+    if 'Data' in df.columns:
+        # Ordenado por Data: filtros de período viram buscas binárias (transform.filter_data)
+        df = df.sort_values('Data', kind='stable', ignore_index=True)
+    # Esquema compacto (categóricos também viram as máscaras de transform.filter_data)
+    return compact_frame(df)
+
+def _description_pairs(part, part_name):
+    """(Parte, Normalizada, Origem) distintos de uma parte: o que o recálculo incremental consulta."""
+    pairs = pd.DataFrame({
+        'Normalizada': categorizer.normalize_series(part['Descrição']).astype(object),
+        'Origem': part['Origem'].astype(object),
+    }).drop_duplicates(ignore_index=True)
+    pairs.insert(0, 'Parte', part_name)
+    return pairs.astype({'Parte': 'category'})
+
+def _read_descriptions(username, manifest):
+    """
+    Tabela de descrições distintas por parte. Partes que faltam nela
+    (armazenamentos antigos) são lidas uma vez e acrescentadas.
+    """
+    path = os.path.join(get_store_dir(username), DESCRIPTIONS_FILE)
+    columns = ['Parte', 'Normalizada', 'Origem']
+    descriptions = pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame(columns=columns)
+    descriptions = descriptions[descriptions['Parte'].isin(manifest['partes']).to_numpy()]
+    known = set(descriptions['Parte'].unique())
+    missing = [p for p in manifest['partes'] if p not in known]
+    if missing:
+        store_dir = get_store_dir(username)
+        extra = [_description_pairs(_read_part(os.path.join(store_dir, p), ['Descrição', 'Origem']), p) for p in missing]
+        descriptions = pd.concat([descriptions, *extra], ignore_index=True)
+        _write_descriptions(username, descriptions)
+    return descriptions.reset_index(drop=True)
+
+def _write_descriptions(username, descriptions):
+    _write_parquet(descriptions, os.path.join(get_store_dir(username), DESCRIPTIONS_FILE))
+
+def _cube_path(username):
+    return os.path.join(get_store_dir(username), CUBE_FILE)
+
+def _read_cube_file(username):
+    path = _cube_path(username)
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+def _write_cube(username, cube):
+    _write_parquet(cube, _cube_path(username))
+
+def _rebuild_cube(username, manifest):
+    """Recalcula o cubo a partir das partes (armazenamentos antigos ou sem cubo)."""
+    columns = ['Data', 'Banco', 'Categoria', 'Centavos']
+    parts = [_read_part(os.path.join(get_store_dir(username), p), columns) for p in manifest['partes']]
+    if parts:
+        cube = transform.build_daily_cube(compact_frame(pd.concat(parts, ignore_index=True)))
+    else:
+        cube = transform.build_daily_cube(compact_frame(pd.DataFrame(columns=columns)))
+    _write_cube(username, cube)
+    return cube
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _read_cube(username, versao):
+    """Cubo diário do usuário. 'versao' entra na chave do cache."""
+    cube = _read_cube_file(username)
+    if cube is None:
+        cube = _rebuild_cube(username, load_manifest(username))
+    return cube
+
+def load_cube(username):
+    """
+    Cubo diário (Data, Banco, Categoria, Entradas, Saídas, Qtd Entradas, Qtd Saídas)
+    mantido a cada importação: KPIs e gráficos escalam com dias x categorias,
+    não com o número de transações.
+    """
+    if not username:
+        return transform.build_daily_cube(compact_frame(pd.DataFrame(columns=['Data', 'Banco', 'Categoria', 'Centavos'])))
+
+    manifest = load_manifest(username)
+    if _needs_recategorize(manifest, rules_manager.load_rules(username)):
+        manifest = _recategorize(username, manifest)
+    return _read_cube(username, manifest['versao'])
+
+def _pix_index_path(username):
+    return os.path.join(get_store_dir(username), PIX_INDEX_FILE)
+
+def _read_pix_index_file(username):
+    path = _pix_index_path(username)
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+def _write_pix_index(username, pix_index):
+    _write_parquet(pix_index, _pix_index_path(username))
+
+def _rebuild_pix_index(username, manifest):
+    """Recalcula o índice Pix a partir das partes (armazenamentos antigos ou regras alteradas)."""
+    columns = ['Data', 'Banco', 'Categoria', 'Beneficiario_Pix', 'Centavos']
+    parts = [_read_part(os.path.join(get_store_dir(username), p), columns) for p in manifest['partes']]
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    pix_index = transform.build_pix_index(compact_frame(df))
+    _write_pix_index(username, pix_index)
+    return pix_index
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _read_pix_index(username, versao):
+    """Índice de contrapartes Pix do usuário. 'versao' entra na chave do cache."""
+    pix_index = _read_pix_index_file(username)
+    if pix_index is None:
+        pix_index = _rebuild_pix_index(username, load_manifest(username))
+    return pix_index
+
+def load_pix_index(username):
+    """
+    Índice de contrapartes Pix (Data, Banco, Categoria, Beneficiario_Pix, Enviado,
+    Qtd Enviado, Recebido, Qtd Recebido, Maior Envio) mantido a cada importação.
+    """
+    if not username:
+        return transform.build_pix_index(compact_frame(pd.DataFrame(columns=['Data', 'Banco', 'Categoria', 'Beneficiario_Pix', 'Centavos'])))
+
+    manifest = load_manifest(username)
+    if _needs_recategorize(manifest, rules_manager.load_rules(username)):
+        manifest = _recategorize(username, manifest)
+    return _read_pix_index(username, manifest['versao'])
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _read_daily_totals(username, versao):
+    return transform.build_daily_totals(_read_cube(username, versao))
+
+def load_daily_totals(username):
+    """Somas acumuladas diárias (transform.build_daily_totals) do cubo do usuário."""
+    if not username:
+        return transform.build_daily_totals(load_cube(username))
+    load_cube(username) # Garante regras aplicadas e cubo gravado
+    return _read_daily_totals(username, load_manifest(username)['versao'])
+
+def load_transactions(username, columns=None):
+    """
+    Carrega o histórico do usuário direto do armazenamento (sem reprocessar extratos).
+    Se as regras mudaram desde a gravação, recategoriza antes de devolver.
+    O resultado segue o esquema compacto (compact_frame).
+    """
+    columns = tuple(columns or COLUMNS)
+    if not username:
+        return compact_frame(pd.DataFrame(columns=list(columns)))
+
+    manifest = load_manifest(username)
+    if _needs_recategorize(manifest, rules_manager.load_rules(username)):
+        manifest = _recategorize(username, manifest)
+
+    return _read_store(username, manifest['versao'], columns)
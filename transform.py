@@ -1,201 +1,568 @@
+from dataclasses import dataclass, field
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+import merchants
+
+# Valores monetários circulam em centavos inteiros (coluna 'Centavos', int64):
+# somas exatas. A conversão para reais acontece só nas telas (views).
+
+# --- CUBO DIÁRIO ---
+# Consolidação (dia x banco x categoria) com somas e contagens de entradas
+# (>= 0) e saídas (< 0). Mantido pelo armazenamento a cada importação, responde
+# KPIs, comparativos, fluxo mensal e gastos por categoria sem varrer transações.
+CUBE_KEYS = ['Data', 'Banco', 'Categoria']
+CUBE_VALUES = ['Entradas', 'Saídas', 'Qtd Entradas', 'Qtd Saídas']
+
+def build_daily_cube(df):
+    """Monta o cubo diário a partir de transações (ordenado por Data)."""
+    centavos = df['Centavos'].to_numpy()
+    saida = centavos < 0
+    flows = pd.DataFrame({
+        'Data': df['Data'].dt.normalize(),
+        'Banco': df['Banco'],
+        'Categoria': df['Categoria'],
+        'Entradas': np.where(saida, 0, centavos),
+        'Saídas': np.where(saida, centavos, 0),
+        'Qtd Entradas': (~saida).astype('int64'),
+        'Qtd Saídas': saida.astype('int64'),
+    }, index=df.index)
+    return _finish_cube(flows.groupby(CUBE_KEYS, observed=True, sort=True).sum().reset_index())
+
+def merge_cubes(*cubes):
+    """Soma cubos (linhas sem transações restantes são descartadas)."""
+    merged = pd.concat([c.astype({'Banco': object, 'Categoria': object}) for c in cubes], ignore_index=True)
+    merged = merged.groupby(CUBE_KEYS, sort=True).sum().reset_index()
+    merged = merged[(merged['Qtd Entradas'] != 0) | (merged['Qtd Saídas'] != 0)]
+    return _finish_cube(merged.reset_index(drop=True))
+
+def negate_cube(cube):
+    """Cubo com sinais invertidos (para remover uma contribuição via merge_cubes)."""
+    return cube.assign(**{col: -cube[col] for col in CUBE_VALUES})
+
+def _finish_cube(cube):
+    for col in ('Banco', 'Categoria'):
+        cube[col] = cube[col].astype('category')
+    return cube.astype({col: 'int64' for col in CUBE_VALUES})
+
+def _is_cube(df):
+    return 'Entradas' in df.columns
+
+def _as_cube(df):
+    return df if _is_cube(df) else build_daily_cube(df)
+
+def _flows(df):
+    """(entradas, saídas) em centavos, de transações ou do cubo diário."""
+    if _is_cube(df):
+        return int(df['Entradas'].sum()), int(df['Saídas'].sum())
+    centavos = df['Centavos'].to_numpy()
+    return int(centavos[centavos > 0].sum()), int(centavos[centavos < 0].sum())
+
 def get_kpis(df):
-    """Calcular KPIs principais: Entradas, Saídas, Saldo, Taxa de Poupança."""
+    """
+    Calcular KPIs principais: Entradas, Saídas, Saldo (em centavos), Taxa de Poupança.
+    Aceita transações ou o cubo diário.
+    """
     if df.empty:
         return 0, 0, 0, 0, 0
     
-    entradas = df[df['Valor'] > 0]['Valor'].sum()
-    saidas = df[df['Valor'] < 0]['Valor'].sum()
+    entradas, saidas = _flows(df)
     saidas_abs = abs(saidas)
     saldo = entradas + saidas
     taxa_poupanca = (saldo / entradas * 100) if entradas > 0 else 0
     
     return entradas, saidas, saidas_abs, saldo, taxa_poupanca
 
-def get_period_comparison(df, inicio_atual, fim_atual):
-    """Calcula variação percentual em relação ao período anterior."""
-    # Define periodo anterior (mesmo delta de dias, deslocado para trás)
-    delta_days = (fim_atual - inicio_atual).days + 1
-    fim_anterior = inicio_atual - pd.Timedelta(days=1)
-    inicio_anterior = fim_anterior - pd.Timedelta(days=delta_days - 1)
-    
-    # Filtra dados anteriores
-    df_anterior = df[(df['Data'].dt.date >= inicio_anterior) & (df['Data'].dt.date <= fim_anterior)]
-    
-    # Filtra dados atuais (para garantir consistência caso o df passado não esteja filtrado por data)
-    df_atual = df[(df['Data'].dt.date >= inicio_atual) & (df['Data'].dt.date <= fim_atual)]
-    
-    # Totais
-    saidas_atual = abs(df_atual[df_atual['Valor'] < 0]['Valor'].sum())
-    saidas_anterior = abs(df_anterior[df_anterior['Valor'] < 0]['Valor'].sum())
-    
-    entradas_atual = df_atual[df_atual['Valor'] > 0]['Valor'].sum()
-    entradas_anterior = df_anterior[df_anterior['Valor'] > 0]['Valor'].sum()
+def _day_bounds(inicio, fim):
+    """Intervalo semiaberto [início do dia 'inicio', início do dia seguinte a 'fim')."""
+    start = np.datetime64(pd.Timestamp(inicio).normalize())
+    stop = np.datetime64(pd.Timestamp(fim).normalize() + pd.Timedelta(days=1))
+    return start, stop
+
+def _date_slice(df, inicio, fim):
+    """
+    Fatia posicional das linhas com inicio <= Data <= fim: duas buscas binárias
+    (sem montar colunas de objetos datetime.date). Exige 'df' ordenado por Data,
+    como tudo o que chega aqui: histórico (transaction_store._read_store e
+    load_data ordenam), cubo diário e índice Pix (agrupados com sort=True).
+    """
+    dates = df['Data'].to_numpy()
+    start, stop = _day_bounds(inicio, fim)
+    return slice(dates.searchsorted(start, side='left'), dates.searchsorted(stop, side='left'))
+
+def _selection_mask(column, selected):
+    """
+    Máscara booleana de pertinência via códigos categóricos: uma tabela de
+    consulta (um bool por categoria) indexada pelos códigos das linhas.
+    """
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column.isin(selected).to_numpy()
+    lookup = np.append(column.cat.categories.isin(selected), False) # Código -1 (vazio) -> False
+    return lookup[column.cat.codes.to_numpy()]
+
+# --- SOMAS ACUMULADAS (prefix sums) ---
+# Totais diários acumulados de entradas e saídas: o total de qualquer período
+# [inicio, fim] são duas buscas binárias e uma subtração.
+
+def build_daily_totals(df):
+    """
+    Somas acumuladas por dia, a partir do cubo diário (ou de transações):
+    {'dias': datetime64 ordenados, 'entradas': int64[n+1], 'saidas': int64[n+1]}.
+    """
+    cube = _as_cube(df)
+    daily = cube.groupby('Data', sort=True)[['Entradas', 'Saídas']].sum()
+    return {
+        'dias': daily.index.to_numpy(),
+        'entradas': np.concatenate([[0], np.cumsum(daily['Entradas'].to_numpy(dtype='int64'))]),
+        'saidas': np.concatenate([[0], np.cumsum(daily['Saídas'].to_numpy(dtype='int64'))]),
+    }
+
+def _as_totals(df):
+    return df if isinstance(df, dict) else build_daily_totals(df)
+
+def range_totals(totals, inicio, fim):
+    """(entradas, saídas) em centavos de [inicio, fim], em O(log n)."""
+    start, stop = _day_bounds(inicio, fim)
+    lo = totals['dias'].searchsorted(start, side='left')
+    hi = totals['dias'].searchsorted(stop, side='left')
+    return int(totals['entradas'][hi] - totals['entradas'][lo]), int(totals['saidas'][hi] - totals['saidas'][lo])
+
+def _pct_change(atual, anterior):
+    """Variação percentual; None quando não há base de comparação."""
+    return (atual - anterior) / anterior * 100 if anterior > 0 else None
+
+def get_comparisons(df, inicio, fim):
+    """
+    Compara o período [inicio, fim] com:
+    - 'anterior': mesma duração, imediatamente antes;
+    - 'mes_anterior': mesma janela um mês antes (MoM);
+    - 'ano_anterior': mesma janela um ano antes (mesmo período do ano passado);
+    - 'doze_meses': 12 meses até 'fim' contra os 12 meses anteriores (YoY).
+    Aceita somas acumuladas (build_daily_totals), cubo diário ou transações.
+    Retorna {nome: {'inicio', 'fim', 'entradas', 'saidas', 'delta_entradas', 'delta_saidas'}};
+    valores em centavos (saídas positivas), deltas em % ou None.
+    """
+    totals = _as_totals(df)
+    inicio, fim = pd.Timestamp(inicio).normalize(), pd.Timestamp(fim).normalize()
+    delta_days = (fim - inicio).days + 1
+    um_mes, um_ano = pd.DateOffset(months=1), pd.DateOffset(years=1)
     
-    # Deltas
-    delta_saidas = ((saidas_atual - saidas_anterior) / saidas_anterior * 100) if saidas_anterior > 0 else 0
-    delta_entradas = ((entradas_atual - entradas_anterior) / entradas_anterior * 100) if entradas_anterior > 0 else 0
+    inicio_12m = fim - um_ano + pd.Timedelta(days=1)
+    windows = {
+        'atual': ((inicio, fim), None),
+        'anterior': ((inicio - pd.Timedelta(days=delta_days), inicio - pd.Timedelta(days=1)), 'atual'),
+        'mes_anterior': ((inicio - um_mes, fim - um_mes), 'atual'),
+        'ano_anterior': ((inicio - um_ano, fim - um_ano), 'atual'),
+        'ultimos_12_meses': ((inicio_12m, fim), None),
+        'doze_meses': ((inicio_12m - um_ano, fim - um_ano), 'ultimos_12_meses'),
+    }
     
-    return delta_saidas, delta_entradas, inicio_anterior, fim_anterior
+    result = {}
+    for name, ((start, end), _) in windows.items():
+        entradas, saidas = range_totals(totals, start, end)
+        result[name] = {'inicio': start.date(), 'fim': end.date(), 'entradas': entradas, 'saidas': abs(saidas)}
+    for name, (_, base) in windows.items():
+        if base:
+            result[name]['delta_entradas'] = _pct_change(result[base]['entradas'], result[name]['entradas'])
+            result[name]['delta_saidas'] = _pct_change(result[base]['saidas'], result[name]['saidas'])
+    return result
+
+def get_period_comparison(df, inicio_atual, fim_atual):
+    """Calcula variação percentual em relação ao período anterior (somas acumuladas, cubo ou transações)."""
+    anterior = get_comparisons(df, inicio_atual, fim_atual)['anterior']
+    return (
+        anterior['delta_saidas'] or 0,
+        anterior['delta_entradas'] or 0,
+        anterior['inicio'],
+        anterior['fim'],
+    )
 
 def filter_data(df, inicio, fim, bancos_selecionados=None, categorias_selecionadas=None):
-    """Aplica filtros de data, categoria e bancos."""
-    df_filtered = df[(df['Data'].dt.date >= inicio) & (df['Data'].dt.date <= fim)]
-    
+    """Aplica filtros de data, categoria e bancos (em transações, cubo diário ou índice Pix, ordenados por Data)."""
+    # Data: fatia contínua do histórico ordenado
+    return _filter_selection(df.iloc[_date_slice(df, inicio, fim)], bancos_selecionados, categorias_selecionadas)
+
+def _filter_selection(df, bancos_selecionados=None, categorias_selecionadas=None):
+    """Filtros de bancos e categorias (sem cópia quando nada é excluído)."""
+    mask = np.ones(len(df), dtype=bool)
     # Filtro de Bancos (Prioridade)
     if bancos_selecionados:
-        df_filtered = df_filtered[df_filtered['Banco'].isin(bancos_selecionados)]
+        mask &= _selection_mask(df['Banco'], bancos_selecionados)
 
     # Filtro de Categorias
     if categorias_selecionadas:
-        df_filtered = df_filtered[df_filtered['Categoria'].isin(categorias_selecionadas)]
+        mask &= _selection_mask(df['Categoria'], categorias_selecionadas)
         
-    return df_filtered
+    return df if mask.all() else df[mask]
 
 def get_monthly_flow(df):
-    """Prepara dados para gráfico de fluxo mensal."""
-    df = df.copy()
-    df['Mes_Ano'] = df['Data'].dt.to_period('M').astype(str)
-    df['Fluxo'] = df['Valor'].apply(lambda x: 'Entrada' if x >= 0 else 'Saída')
+    """Prepara dados para gráfico de fluxo mensal (Mes_Ano, Fluxo, Centavos) a partir do cubo diário."""
+    cube = _as_cube(df)
+    meses = cube['Data'].to_numpy().astype('datetime64[M]')
+    by_month = cube[CUBE_VALUES].groupby(meses).sum()
+    by_month.index = pd.Index(np.datetime_as_string(by_month.index.to_numpy(), unit='M'), name='Mes_Ano')
     
-    monthly = df.groupby(['Mes_Ano', 'Fluxo'])['Valor'].sum().reset_index()
-    monthly['Valor'] = monthly['Valor'].abs()
-    return monthly
-
-def get_categories_ranking(df):
-    """Retorna dados de despesas por categoria rankeados (Visão Macro)."""
-    expenses = df[df['Valor'] < 0].copy()
-    expenses['Valor Abs'] = expenses['Valor'].abs()
-    ranking = expenses.groupby('Categoria')['Valor Abs'].sum().sort_values(ascending=True)
+    monthly = pd.concat([
+        pd.DataFrame({'Fluxo': 'Entrada', 'Centavos': by_month['Entradas'], 'Qtd': by_month['Qtd Entradas']}),
+        pd.DataFrame({'Fluxo': 'Saída', 'Centavos': -by_month['Saídas'], 'Qtd': by_month['Qtd Saídas']}),
+    ]).reset_index()
+    monthly = monthly[monthly['Qtd'] > 0].sort_values(['Mes_Ano', 'Fluxo'], ignore_index=True)
+    return monthly[['Mes_Ano', 'Fluxo', 'Centavos']]
+
+def get_spent_by_category(df):
+    """Total gasto (centavos, positivo) por categoria, de transações ou do cubo diário."""
+    if _is_cube(df):
+        spent = -df[df['Qtd Saídas'] > 0].groupby('Categoria', observed=True)['Saídas'].sum()
+    else:
+        spent = -df[df['Centavos'] < 0].groupby('Categoria', observed=True)['Centavos'].sum()
+    return spent.rename('Centavos Abs')
+
+def get_categories_ranking(df, cube=None):
+    """
+    Retorna dados de despesas por categoria rankeados (Visão Macro).
+    O ranking vem do cubo diário já filtrado, quando informado.
+    """
+    expenses = df[df['Centavos'] < 0].copy()
+    expenses['Centavos Abs'] = -expenses['Centavos']
+    ranking = get_spent_by_category(cube if cube is not None else expenses).sort_values(ascending=True)
     return ranking, expenses
 
 def get_category_details(df, category):
     """Retorna detalhamento de uma categoria específica."""
-    details = df[(df['Categoria'] == category) & (df['Valor'] < 0)].copy()
-    details['Valor Abs'] = details['Valor'].abs()
+    details = df[(df['Categoria'] == category) & (df['Centavos'] < 0)]
     
     # Agrupa por descrição
-    grouped = details.groupby('Descrição')['Valor Abs'].sum().reset_index().sort_values('Valor Abs', ascending=False)
+    grouped = (-details['Centavos']).groupby(details['Descrição'], observed=True).sum().rename('Centavos Abs')
+    grouped = grouped.reset_index().sort_values('Centavos Abs', ascending=False)
     return grouped, details
 
 def extract_pix_beneficiary(desc):
-    """Extrai nome do beneficiário Pix da descrição."""
-    desc = str(desc).lower()
-    if 'pix' in desc and ('enviado' in desc or 'enviada' in desc):
-        try:
-            if 'enviada' in desc: parts = desc.split('enviada')
-            else: parts = desc.split('enviado')
-            
-            if len(parts) > 1:
-                # Pega a parte depois de "enviada..."
-                raw_name = parts[1].lower().strip()
-                
-                # Remove prefixos comuns de sujeira
-                for prefix in ['pelo pix -', 'via pix -', 'pelo pix', 'via pix', 'pix -', '- ']:
-                    if raw_name.startswith(prefix):
-                        raw_name = raw_name.replace(prefix, "").strip()
-                
-                # Formata Nome Próprio
-                return raw_name.title()[:30] # Limita tamanho
-        except: pass
-    return "Outros"
+    """Extrai nome do beneficiário Pix da descrição (ver merchants.pix_beneficiaries)."""
+    return merchants.pix_beneficiaries(pd.Series([desc])).iloc[0]
 
-def get_pix_metrics(df):
-    """Calcula métricas e ranking de Pix."""
-    df = df.copy()
-    df['Beneficiario_Pix'] = df['Descrição'].apply(extract_pix_beneficiary)
-    
-    pix_only = df[(df['Beneficiario_Pix'] != "Outros") & (df['Valor'] < 0)].copy()
-    pix_only['Valor Abs'] = pix_only['Valor'].abs()
+def _pix_rows(expenses):
+    """Linhas Pix (envios) com beneficiário e valor absoluto, para listagem/exportação."""
+    if 'Beneficiario_Pix' in expenses.columns:
+        beneficiarios = expenses['Beneficiario_Pix'] # Extraído na importação
+    else:
+        beneficiarios = merchants.pix_beneficiaries(expenses['Descrição'])
+    is_pix = (beneficiarios != merchants.PIX_OTHERS).to_numpy()
     
+    # Só o subconjunto Pix ganha colunas novas
+    pix_only = expenses.loc[is_pix, ['Data', 'Descrição', 'Banco', 'Categoria', 'Centavos']]
+    return pix_only.assign(Beneficiario_Pix=beneficiarios[is_pix], **{'Centavos Abs': -pix_only['Centavos']})
+
+def _pix_metrics(expenses):
+    """Métricas Pix a partir das linhas de saída (sem cópias do DataFrame inteiro)."""
+    pix_only = _pix_rows(expenses)
     if pix_only.empty:
         return None, None, None, None, pd.DataFrame(), pd.DataFrame()
-
-    total_pix = pix_only['Valor Abs'].sum()
-    qtd_pix = len(pix_only)
-    avg_pix = total_pix / qtd_pix
-    max_pix = pix_only['Valor Abs'].max()
-    
-    pix_rank = pix_only.groupby('Beneficiario_Pix')['Valor Abs'].sum().sort_values(ascending=True).tail(10)
     
+    total_pix, qtd_pix, avg_pix, max_pix, pix_rank, _ = pix_index_metrics(build_pix_index(pix_only))
     return pix_only, total_pix, qtd_pix, avg_pix, max_pix, pix_rank
 
-def detect_subscriptions(df):
-    """Detecta possíveis assinaturas (Valores recorrentes). Normaliza nomes de serviços."""
-    # Filtra saídas
-    expenses = df[df['Valor'] < 0].copy()
+def get_pix_metrics(df):
+    """Calcula métricas e ranking de Pix."""
+    return _pix_metrics(df[df['Centavos'].to_numpy() < 0])
+
+# --- ÍNDICE DE CONTRAPARTES PIX ---
+# Consolidação (dia x banco x categoria x contraparte) com enviado/recebido
+# (centavos), quantidades e maior envio. Mantido pelo armazenamento a cada
+# importação, responde totais, ranking, evolução diária e o detalhamento por
+# pessoa para qualquer filtro sem varrer transações.
+PIX_KEYS = ['Data', 'Banco', 'Categoria', 'Beneficiario_Pix']
+PIX_SUMS = ['Enviado', 'Qtd Enviado', 'Recebido', 'Qtd Recebido']
+PIX_VALUES = PIX_SUMS + ['Maior Envio']
+
+def build_pix_index(df):
+    """Monta o índice de contrapartes Pix a partir de transações (ordenado por Data)."""
+    if 'Beneficiario_Pix' in df.columns:
+        beneficiarios = df['Beneficiario_Pix']
+    else:
+        beneficiarios = merchants.pix_beneficiaries(df['Descrição'])
+    is_pix = (beneficiarios != merchants.PIX_OTHERS).to_numpy()
+    centavos = df['Centavos'].to_numpy()[is_pix]
+    enviado = np.where(centavos < 0, -centavos, 0)
+    rows = pd.DataFrame({
+        'Data': df['Data'].dt.normalize().to_numpy()[is_pix],
+        'Banco': df['Banco'].to_numpy(dtype=object)[is_pix],
+        'Categoria': df['Categoria'].to_numpy(dtype=object)[is_pix],
+        'Beneficiario_Pix': beneficiarios.to_numpy(dtype=object)[is_pix],
+        'Enviado': enviado,
+        'Qtd Enviado': (centavos < 0).astype('int64'),
+        'Recebido': np.where(centavos > 0, centavos, 0),
+        'Qtd Recebido': (centavos > 0).astype('int64'),
+        'Maior Envio': enviado,
+    })
+    return _group_pix_index(rows)
+
+def merge_pix_indexes(*indexes):
+    """
+    Junta índices de contrapartes (somas e contagens somadas, maior envio pelo
+    máximo; grupos sem envios nem recebimentos restantes são descartados).
+    """
+    merged = pd.concat([i.astype({col: object for col in PIX_KEYS[1:]}) for i in indexes], ignore_index=True)
+    return _group_pix_index(merged)
+
+def negate_pix_index(index):
+    """
+    Índice com somas e contagens invertidas (para remover uma contribuição via
+    merge_pix_indexes). O maior envio vira 0: máximo não se desfaz por subtração.
+    """
+    return index.assign(**{col: -index[col] for col in PIX_SUMS}, **{'Maior Envio': 0})
+
+def _group_pix_index(rows):
+    agg = dict.fromkeys(PIX_SUMS, 'sum')
+    agg['Maior Envio'] = 'max'
+    index = rows.groupby(PIX_KEYS, sort=True).agg(agg).reset_index()
+    index = index[(index['Qtd Enviado'] != 0) | (index['Qtd Recebido'] != 0)].reset_index(drop=True)
+    for col in PIX_KEYS[1:]:
+        index[col] = index[col].astype('category')
+    return index.astype({col: 'int64' for col in PIX_VALUES})
+
+def pix_index_metrics(index):
+    """
+    Métricas de envios a partir do índice (filtrado): (total, quantidade,
+    ticket médio, maior envio, ranking top 10 por beneficiário, série diária),
+    valores em centavos. Sem envios: Nones e séries vazias.
+    """
+    sent = index[index['Qtd Enviado'].to_numpy() > 0]
+    if sent.empty:
+        return None, None, None, None, pd.Series(dtype='int64'), pd.Series(dtype='int64')
     
-    # --- Normalização de Apps (Refinamento) ---
-    def normalize_service(desc):
-        d_lower = str(desc).lower()
-        if 'uber' in d_lower: return 'Uber'
-        if '99' in d_lower and '99 ' in d_lower: return '99 App' # Evita '9.99'
-        if 'ifood' in d_lower: return 'iFood'
-        if 'rappi' in d_lower: return 'Rappi'
-        if 'netflix' in d_lower: return 'Netflix'
-        if 'spotify' in d_lower: return 'Spotify'
-        if 'amazon' in d_lower or 'amzn' in d_lower: return 'Amazon'
-        if 'apple' in d_lower: return 'Apple'
-        if 'google' in d_lower: return 'Google'
-        # Mantém original se não for app conhecido
-        return desc
-
-    # Cria coluna temporária normalizada
-    expenses['Service_Norm'] = expenses['Descrição'].apply(normalize_service)
+    total_pix = int(sent['Enviado'].sum())
+    qtd_pix = int(sent['Qtd Enviado'].sum())
+    avg_pix = total_pix / qtd_pix
+    max_pix = int(sent['Maior Envio'].max())
     
-    # Agrupa por Serviço Normalizado e conta ocorrências
-    counts = expenses['Service_Norm'].value_counts()
-    potential_subs = counts[counts >= 2].index
+    # Ranking só de pessoas: Pix sem nome reconhecível entra nos totais, não no ranking
+    named = sent[(sent['Beneficiario_Pix'] != merchants.PIX_UNNAMED).to_numpy()]
+    pix_rank = named.groupby('Beneficiario_Pix', observed=True)['Enviado'].sum().rename('Centavos Abs')
+    pix_rank = pix_rank.sort_index().sort_values(ascending=True).tail(10)
+    pix_rank.index = pix_rank.index.astype(object)
+    pix_daily = sent.groupby('Data')['Enviado'].sum()
+    return total_pix, qtd_pix, avg_pix, max_pix, pix_rank, pix_daily
+
+def get_pix_counterparty(index, beneficiario):
+    """
+    Detalhamento de uma contraparte no índice (filtrado): totais, último envio/
+    recebimento e série mensal (Mes_Ano, Enviado, Qtd Enviado, Recebido,
+    Qtd Recebido), valores em centavos.
+    """
+    rows = index[(index['Beneficiario_Pix'] == beneficiario).to_numpy()]
+    meses = rows['Data'].to_numpy().astype('datetime64[M]')
+    monthly = rows[PIX_SUMS].groupby(meses).sum()
+    monthly.index = pd.Index(np.datetime_as_string(monthly.index.to_numpy(), unit='M'), name='Mes_Ano')
+    return {
+        'enviado': int(rows['Enviado'].sum()),
+        'recebido': int(rows['Recebido'].sum()),
+        'ultimo_envio': rows.loc[rows['Qtd Enviado'] > 0, 'Data'].max(),
+        'ultimo_recebimento': rows.loc[rows['Qtd Recebido'] > 0, 'Data'].max(),
+        'mensal': monthly.reset_index(),
+    }
+
+# --- ANÁLISE CONSOLIDADA (uma passada por rerun) ---
+
+@dataclass
+class DashboardAnalytics:
+    """Resultado de compute_analytics: o que Visão Geral, Categorias e Pix exibem (valores em centavos)."""
+    entradas: int = 0
+    saidas: int = 0
+    saidas_abs: int = 0
+    saldo: int = 0
+    taxa_poupanca: float = 0
+    dias: int = 1
+    monthly_flow: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=['Mes_Ano', 'Fluxo', 'Centavos']))
+    category_ranking: pd.Series = field(default_factory=lambda: pd.Series(dtype='int64'))
+    expenses: pd.DataFrame = field(default_factory=pd.DataFrame)
+    top_expenses: pd.DataFrame = field(default_factory=pd.DataFrame)
+    pix_only: pd.DataFrame = None
+    total_pix: int = None
+    qtd_pix: int = None
+    avg_pix: float = None
+    max_pix: int = None
+    pix_rank: pd.Series = None
+    pix_daily: pd.Series = None
+    pix_index: pd.DataFrame = None
+
+def compute_analytics(df, cube=None, pix_index=None):
+    """
+    Calcula numa passada tudo o que as abas principais precisam. Totais, fluxo
+    mensal e ranking vêm do cubo diário (filtrado), métricas Pix do índice de
+    contrapartes (filtrado); das transações filtradas sai uma única seleção
+    das linhas de saída, compartilhada pelo Top 5, pelo detalhamento de
+    categorias e pela listagem Pix. Nenhuma cópia do DataFrame
+    inteiro nem colunas temporárias nele.
+    """
+    result = DashboardAnalytics()
+    if 'Centavos' not in df.columns:
+        return result # Sem dados carregados
+    cube = cube if cube is not None else build_daily_cube(df)
     
-    subs_data = []
+    result.entradas, result.saidas, result.saidas_abs, result.saldo, result.taxa_poupanca = get_kpis(cube)
+    if not cube.empty:
+        result.dias = (cube['Data'].iloc[-1] - cube['Data'].iloc[0]).days + 1
+    result.monthly_flow = get_monthly_flow(cube)
+    result.category_ranking = get_spent_by_category(cube).sort_values(ascending=True)
     
-    for service_name in potential_subs:
-        # Pega transações desse serviço
-        dfo = expenses[expenses['Service_Norm'] == service_name].sort_values('Data')
-        
-        # O desvio padrão do valor para iFood/Uber é ALTO (valores variam), mas a FREQUÊNCIA é alta.
-        # Para serviços fixos (Netflix), desvio é baixo.
-        
-        # Média de dias entre transações
-        dfo['Delta'] = dfo['Data'].diff().dt.days
-        avg_days = dfo['Delta'].mean()
-        
-        freq = "Recorrente"
-        is_subscription = False
-        
-        # Lógica Híbrida:
-        # 1. Valor Fixo (Assinatura Real: Netflix, Spotify)
-        std_val = dfo['Valor'].std()
-        if (pd.isna(std_val) or std_val < 5.0) and (25 <= avg_days <= 35):
-            freq = "Mensal (Fixo)"
-            is_subscription = True
-            
-        # 2. Uso Frequente (iFood, Uber) - Valores variam, mas uso é constante
-        elif service_name in ['Uber', 'iFood', '99 App', 'Rappi'] and (avg_days <= 10):
-            freq = "Uso Frequente"
-            is_subscription = True
-            
-        # 3. Pix recorrente (Para pessoas)
-        elif 25 <= avg_days <= 35:
-            # Se for mensal e não for app variante, pode ser aluguel/faxina
-            freq = "Mensal (Variável)"
-            is_subscription = True
-
-        if is_subscription:
-            last_date = dfo['Data'].max()
-            avg_val = dfo['Valor'].mean()
-            total_val = dfo['Valor'].sum()
-            
-            subs_data.append({
-                'Serviço': service_name if len(service_name) < 20 else service_name[:20] + '...',
-                'Valor Médio': avg_val,
-                'Frequência': freq,
-                'Último Pagto': last_date
-            })
-            
-    return pd.DataFrame(subs_data)
+    # Máscara de sinal única sobre as transações
+    result.expenses = df[df['Centavos'].to_numpy() < 0]
+    result.top_expenses = result.expenses.nsmallest(5, 'Centavos')
+    # Pix: linhas só para listagem; números vêm do índice de contrapartes (filtrado)
+    pix_only = _pix_rows(result.expenses)
+    if not pix_only.empty:
+        result.pix_only = pix_only
+        result.pix_index = pix_index if pix_index is not None else build_pix_index(pix_only)
+        (result.total_pix, result.qtd_pix, result.avg_pix, result.max_pix,
+         result.pix_rank, result.pix_daily) = pix_index_metrics(result.pix_index)
+    return result
+
+# --- MEMOIZAÇÃO DOS RESULTADOS DERIVADOS ---
+
+# Combinações (usuário, versão dos dados, filtros) guardadas; as menos usadas saem primeiro
+DERIVED_CACHE_ENTRIES = 32
+
+@st.cache_resource(show_spinner=False, max_entries=DERIVED_CACHE_ENTRIES)
+def _cached_dashboard(username, versao, inicio, fim, bancos, categorias, _df, _cube, _daily_totals, _pix_index):
+    """Filtros + análise + comparativos. Só a chave (sem os '_' DataFrames) é hasheada."""
+    df_filtered = filter_data(_df, inicio, fim, list(bancos), list(categorias))
+    cube_filtered = filter_data(_cube, inicio, fim, list(bancos), list(categorias))
+    pix_filtered = filter_data(_pix_index, inicio, fim, list(bancos), list(categorias)) if _pix_index is not None else None
+    # Comparativos com os mesmos bancos/categorias dos KPIs: somas acumuladas do
+    # cubo filtrado só pela seleção (os períodos anteriores ficam fora de [inicio, fim]).
+    # Seleção que cobre o cubo inteiro (o padrão da tela: tudo marcado) usa as somas gravadas
+    cube_selected = _filter_selection(_cube, list(bancos), list(categorias))
+    totals = _daily_totals if cube_selected is _cube else build_daily_totals(cube_selected)
+    comparisons = get_comparisons(totals, inicio, fim)
+    anterior = comparisons['anterior']
+    return {
+        'df_filtered': df_filtered,
+        'cube_filtered': cube_filtered,
+        'analytics': compute_analytics(df_filtered, cube_filtered, pix_filtered),
+        'comparisons': comparisons,
+        'delta_saidas': anterior['delta_saidas'] or 0,
+        'delta_entradas': anterior['delta_entradas'] or 0,
+    }
+
+def get_dashboard(username, versao, df, cube, daily_totals, inicio, fim, bancos_selecionados=None, categorias_selecionadas=None, pix_index=None):
+    """
+    Resultados do dashboard memoizados por (usuário, versão dos dados, período,
+    bancos, categorias). Reruns que não mudam dados nem filtros (botões de
+    contas, metas, temas) reaproveitam tudo. O resultado é compartilhado entre
+    reruns: trate-o como somente leitura.
+    """
+    return _cached_dashboard(
+        username, versao, inicio, fim,
+        tuple(bancos_selecionados or ()), tuple(categorias_selecionadas or ()),
+        df, cube, daily_totals, pix_index,
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=DERIVED_CACHE_ENTRIES)
+def _cached_subscriptions(username, versao, _df):
+    return detect_subscriptions(_df)
+
+def get_subscriptions(username, versao, df):
+    """Assinaturas do histórico completo, memoizadas pela versão dos dados do usuário."""
+    return _cached_subscriptions(username, versao, df)
+
+# --- ASSINATURAS / RECORRÊNCIAS ---
+
+# Apps de uso frequente (ids de merchants.BRANDS): valores variam, mas a frequência é alta
+FREQUENT_APPS = ['uber', 'ifood', '99app', 'rappi']
+
+# Períodos de referência (dias) para o score de periodicidade: semanal, mensal, anual
+PERIODS = np.array([7.0, 30.44, 365.25])
+
+def _recurrence_stats(expenses):
+    """
+    Estatísticas de recorrência de TODOS os comerciantes numa passada agrupada:
+    quantidade, intervalo médio e desvio entre cobranças (dias), média e
+    desvio do valor e última data. Só comerciantes com 2+ cobranças; os mais
+    frequentes primeiro.
+    """
+    if 'Comerciante' in expenses.columns:
+        comerciantes = expenses['Comerciante']
+    else:
+        comerciantes = merchants.canonical_merchants(expenses['Descrição'])
+    grupo, svc_names = pd.factorize(comerciantes, use_na_sentinel=False)
+
+    counts = np.bincount(grupo, minlength=len(svc_names))
+    keep = counts[grupo] >= 2
+    frame = pd.DataFrame({
+        'grupo': grupo[keep],
+        'Data': expenses['Data'].to_numpy()[keep],
+        'Centavos': expenses['Centavos'].to_numpy()[keep],
+    }).sort_values(['grupo', 'Data'], kind='stable', ignore_index=True)
+
+    # Intervalo entre cobranças consecutivas do mesmo serviço (dias inteiros)
+    gaps = frame['Data'].diff().dt.days
+    first = frame['grupo'].ne(frame['grupo'].shift()).to_numpy()
+    frame['Dias'] = gaps.mask(first)
+
+    stats = frame.groupby('grupo', sort=False).agg(
+        n=('Centavos', 'size'),
+        media_dias=('Dias', 'mean'),
+        desvio_dias=('Dias', 'std'),
+        media=('Centavos', 'mean'),
+        desvio=('Centavos', 'std'),
+        ultimo=('Data', 'max'),
+    )
+    stats['servico'] = np.asarray(svc_names, dtype=object)[stats.index]
+    order = np.argsort(-stats['n'].to_numpy(), kind='stable')
+    return stats.iloc[order]
+
+def detect_subscriptions(df):
+    """
+    Detecta possíveis assinaturas (valores recorrentes) agrupando pelo
+    comerciante canônico (merchants). Além da frequência, estima a confiança (periodicidade,
+    regularidade dos intervalos e do valor, tamanho da amostra) e a data
+    prevista da próxima cobrança.
+    """
+    columns = ['Data', 'Descrição', 'Centavos'] + (['Comerciante'] if 'Comerciante' in df.columns else [])
+    expenses = df.loc[df['Centavos'].to_numpy() < 0, columns]
+    if expenses.empty:
+        return pd.DataFrame()
+    stats = _recurrence_stats(expenses)
+    if stats.empty:
+        return pd.DataFrame()
+
+    media_dias = stats['media_dias']
+    mensal = media_dias.between(25, 35)
+    # Lógica Híbrida:
+    # 1. Valor Fixo (Assinatura Real: Netflix, Spotify)
+    # 2. Uso Frequente (iFood, Uber) - Valores variam, mas uso é constante
+    # 3. Pix recorrente (aluguel, faxina): mensal com valor variável
+    fixo = (stats['desvio'].isna() | (stats['desvio'] < 500)) & mensal
+    frequente = stats['servico'].isin(FREQUENT_APPS) & (media_dias <= 10)
+    freq = pd.Series(np.select(
+        [fixo, frequente, mensal],
+        ["Mensal (Fixo)", "Uso Frequente", "Mensal (Variável)"],
+        default="",
+    ), index=stats.index)
+    subs = stats[freq != ""]
+    if subs.empty:
+        return pd.DataFrame()
+
+    # Confiança (0-1): proximidade de um período semanal/mensal/anual,
+    # intervalos e valores estáveis (coef. de variação) e nº de cobranças
+    media_dias = subs['media_dias'].to_numpy()
+    periodicidade = np.clip(1 - np.abs(media_dias[:, None] - PERIODS) / PERIODS, 0, 1).max(axis=1)
+    regularidade = 1 / (1 + (subs['desvio_dias'].fillna(0) / np.maximum(media_dias, 1)).to_numpy())
+    estabilidade = 1 / (1 + (subs['desvio'].fillna(0) / subs['media'].abs()).to_numpy())
+    amostra = 1 - 1 / subs['n'].to_numpy()
+    confianca = (periodicidade + regularidade + estabilidade) / 3 * amostra
+
+    servico = subs['servico'].map(merchants.merchant_name).map(lambda name: name if len(name) < 20 else name[:20] + '...')
+    return pd.DataFrame({
+        'Serviço': servico.to_numpy(),
+        'Centavos Médio': subs['media'].to_numpy(),
+        'Frequência': freq[subs.index].to_numpy(),
+        'Último Pagto': subs['ultimo'].to_numpy(),
+        'Confiança': confianca.round(2),
+        'Próxima Cobrança': (subs['ultimo'] + pd.to_timedelta(media_dias.round(), unit='D')).to_numpy(),
+    })
 
 def get_categories_list(df):
     """Retorna lista única de categorias ordenadas para o selectbox."""
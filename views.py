@@ -1,22 +1,50 @@
 import streamlit as st
 import plotly.express as px
+import pandas as pd
 
-def render_overview_tab(monthly_flow, df_filtered, kpi_data):
-    """Renderiza aba de Visão Geral (KPIs + Fluxo Mensal + Top Despesas)."""
+def _reais(centavos):
+    """Centavos (int) -> reais, só para exibição."""
+    return centavos / 100
+
+def _delta_text(delta):
+    return f"{delta:+.1f}%" if delta is not None else None
+
+def render_overview_tab(analytics, delta_entradas, delta_saidas, meta_gastos, comparisons=None):
+    """
+    Renderiza aba de Visão Geral (KPIs + Comparativos + Fluxo Mensal + Top Despesas).
+    'analytics' é o resultado de transform.compute_analytics (valores em centavos).
+    """
     
     # 1. KPIs Globais (Movido para cá)
-    entradas, saidas, saidas_abs, saldo, taxa_poupanca, delta_entradas, delta_saidas, meta_gastos = kpi_data
+    entradas, saidas, saidas_abs, saldo = (
+        _reais(analytics.entradas), _reais(analytics.saidas), _reais(analytics.saidas_abs), _reais(analytics.saldo)
+    )
     
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Receitas", f"R$ {entradas:,.2f}", delta=f"{delta_entradas:+.1f}% vs Anterior")
     col2.metric("Despesas", f"R$ {saidas:,.2f}", delta=f"{delta_saidas:+.1f}% vs Anterior", delta_color="inverse")
-    col3.metric("Saldo Líquido", f"R$ {saldo:,.2f}", delta=f"{taxa_poupanca:.1f}% Poupado")
+    col3.metric("Saldo Líquido", f"R$ {saldo:,.2f}", delta=f"{analytics.taxa_poupanca:.1f}% Poupado")
     
     # Média Diária (Estimativa simples)
-    days_range = (df_filtered['Data'].max() - df_filtered['Data'].min()).days + 1 if not df_filtered.empty else 1
-    media_diaria = saidas_abs / days_range if days_range > 0 else 0
+    media_diaria = saidas_abs / analytics.dias if analytics.dias > 0 else 0
     col4.metric("Média Diária", f"R$ {media_diaria:,.2f}")
     
+    # Comparativos de despesas (transform.get_comparisons)
+    if comparisons:
+        c1, c2, c3 = st.columns(3)
+        for col, key, label in [
+            (c1, 'mes_anterior', "Despesas vs Mês Anterior"),
+            (c2, 'ano_anterior', "Despesas vs Mesmo Período (Ano Anterior)"),
+            (c3, 'doze_meses', "Despesas 12 Meses vs 12 Anteriores"),
+        ]:
+            comp = comparisons[key]
+            base = comparisons['ultimos_12_meses'] if key == 'doze_meses' else comparisons['atual']
+            col.metric(
+                label, f"R$ {_reais(base['saidas']):,.2f}",
+                delta=_delta_text(comp['delta_saidas']), delta_color="inverse",
+                help=f"Comparado a R$ {_reais(comp['saidas']):,.2f} de {comp['inicio']:%d/%m/%Y} a {comp['fim']:%d/%m/%Y}"
+            )
+    
     if meta_gastos > 0:
         st.markdown("###")
         st.write(f"**Progresso da Meta:** R$ {saidas_abs:,.2f} / R$ {meta_gastos:,.2f}")
@@ -29,8 +57,9 @@ def render_overview_tab(monthly_flow, df_filtered, kpi_data):
     col_main, col_detail = st.columns([2, 1])
     
     with col_main:
+        monthly_flow = analytics.monthly_flow
         fig_fluxo = px.bar(
-            monthly_flow, x='Mes_Ano', y='Valor', color='Fluxo', barmode='group',
+            monthly_flow.assign(Valor=_reais(monthly_flow['Centavos'])), x='Mes_Ano', y='Valor', color='Fluxo', barmode='group',
             color_discrete_map={'Entrada': '#2ECEC0', 'Saída': '#FF5A5F'},
             title="<b>Fluxo de Caixa Mensal</b>",
             text_auto='.2s', template='plotly_white'
@@ -41,10 +70,10 @@ def render_overview_tab(monthly_flow, df_filtered, kpi_data):
 
     with col_detail:
         st.markdown("##### 🚨 Top 5 Despesas")
-        top_expenses = df_filtered[df_filtered['Valor'] < 0].nsmallest(5, 'Valor')
-        for _, row in top_expenses.iterrows():
-            st.warning(f"**{row['Descrição']}**\n\nR$ {row['Valor']:,.2f} ({row['Data'].strftime('%d/%m')})")
+        for _, row in analytics.top_expenses.iterrows():
+            st.warning(f"**{row['Descrição']}**\n\nR$ {_reais(row['Centavos']):,.2f} ({row['Data'].strftime('%d/%m')})")
 
+import merchants
 import transform
 
 def render_categories_tab(categories_ranking, expenses_df):
@@ -58,7 +87,7 @@ def render_categories_tab(categories_ranking, expenses_df):
             st.caption("Clique em uma barra para ver os detalhes da categoria.")
             
             fig_bar_cat = px.bar(
-                categories_ranking, 
+                _reais(categories_ranking).rename('Valor'), 
                 orientation='h',
                 title="",
                 text_auto='.2s',
@@ -99,7 +128,7 @@ def render_categories_tab(categories_ranking, expenses_df):
                      st.caption("Principais Descrições:")
 
                 st.dataframe(
-                    grouped_details[['Descrição', 'Valor Abs']].rename(columns={'Valor Abs': 'Valor'}),
+                    grouped_details[['Descrição']].assign(Valor=_reais(grouped_details['Centavos Abs'])),
                     column_config={
                         "Valor": st.column_config.NumberColumn(format="R$ %.2f"),
                     },
@@ -120,14 +149,18 @@ def render_categories_tab(categories_ranking, expenses_df):
     else:
         st.info("Sem despesas para exibir.")
 
-def render_pix_tab(pix_only, pix_rank, total_pix, qtd_pix, avg_pix, max_pix):
-    """Renderiza aba de Pix (Métricas, Gráficos e Export)."""
+def render_pix_tab(pix_only, pix_rank, total_pix, qtd_pix, avg_pix, max_pix, pix_daily=None, pix_index=None):
+    """Renderiza aba de Pix (Métricas, Gráficos, Detalhamento por pessoa e Export)."""
     if pix_only is not None and not pix_only.empty:
         p1, p2, p3, p4 = st.columns(4)
-        p1.metric("💸 Total Enviado", f"R$ {total_pix:,.2f}")
+        p1.metric("💸 Total Enviado", f"R$ {_reais(total_pix):,.2f}")
         p2.metric("🔢 Qtd. Transações", f"{qtd_pix}")
-        p3.metric("📏 Ticket Médio", f"R$ {avg_pix:,.2f}")
-        p4.metric("🔝 Maior Envio", f"R$ {max_pix:,.2f}")
+        p3.metric("📏 Ticket Médio", f"R$ {_reais(avg_pix):,.2f}")
+        p4.metric("🔝 Maior Envio", f"R$ {_reais(max_pix):,.2f}")
+        
+        # Reais só para exibição/exportação
+        pix_only = pix_only.assign(**{'Valor Abs': _reais(pix_only['Centavos Abs'])})
+        pix_rank = _reais(pix_rank)
         
         st.divider()
         
@@ -135,7 +168,10 @@ def render_pix_tab(pix_only, pix_rank, total_pix, qtd_pix, avg_pix, max_pix):
         
         with col_pix1:
             st.markdown("##### 📈 Evolução dos Envios por Dia")
-            pix_daily = pix_only.groupby('Data')['Valor Abs'].sum().reset_index()
+            if pix_daily is not None:
+                pix_daily = _reais(pix_daily).rename('Valor Abs').reset_index() # Do índice de contrapartes
+            else:
+                pix_daily = pix_only.groupby(pix_only['Data'].dt.normalize())['Valor Abs'].sum().reset_index()
             fig_pix_line = px.line(pix_daily, x='Data', y='Valor Abs', markers=True, template="plotly_white")
             fig_pix_line.update_traces(hovertemplate='<b>%{x|%d/%m/%Y}</b><br>R$ %{y:,.2f}<extra></extra>')
             fig_pix_line.update_layout(yaxis_title="Valor (R$)", xaxis_title=None)
@@ -146,6 +182,9 @@ def render_pix_tab(pix_only, pix_rank, total_pix, qtd_pix, avg_pix, max_pix):
             fig_pix_bar.update_traces(hovertemplate='<b>%{y}</b><br>Total: R$ %{x:,.2f}<extra></extra>')
             fig_pix_bar.update_layout(yaxis_title=None, xaxis_title="Total (R$)")
             st.plotly_chart(fig_pix_bar, use_container_width=True)
+
+            if pix_index is not None:
+                render_pix_counterparty(pix_index)
             
         with col_pix2:
             st.markdown("##### 💾 Exportar Dados")
@@ -170,6 +209,29 @@ def render_pix_tab(pix_only, pix_rank, total_pix, qtd_pix, avg_pix, max_pix):
     else:
         st.info("Nenhuma transferência Pix enviada identificada.")
 
+def render_pix_counterparty(pix_index):
+    """Detalhamento de uma pessoa (enviado/recebido por mês) a partir do índice Pix."""
+    st.markdown("##### 🔎 Detalhar Pessoa")
+    totals = pix_index.groupby('Beneficiario_Pix', observed=True)['Enviado'].sum().sort_values(ascending=False)
+    totals = totals[totals.index != merchants.PIX_UNNAMED] # Não é uma pessoa
+    person = st.selectbox("Pessoa", totals.index.astype(object).tolist(), label_visibility="collapsed")
+    if person is None:
+        return
+    
+    detail = transform.get_pix_counterparty(pix_index, person)
+    d1, d2, d3 = st.columns(3)
+    d1.metric("Enviado", f"R$ {_reais(detail['enviado']):,.2f}")
+    d2.metric("Recebido", f"R$ {_reais(detail['recebido']):,.2f}")
+    last = detail['ultimo_envio']
+    d3.metric("Último Envio", last.strftime('%d/%m/%Y') if pd.notna(last) else "-")
+    
+    monthly = detail['mensal'].assign(Enviado=lambda m: _reais(m['Enviado']), Recebido=lambda m: _reais(m['Recebido']))
+    fig = px.bar(monthly, x='Mes_Ano', y=['Enviado', 'Recebido'], barmode='group', template="plotly_white",
+                 color_discrete_sequence=['#EF553B', '#00CC96'])
+    fig.update_traces(hovertemplate='<b>%{x}</b><br>R$ %{y:,.2f}<extra></extra>')
+    fig.update_layout(yaxis_title="Valor (R$)", xaxis_title=None, legend_title=None)
+    st.plotly_chart(fig, use_container_width=True)
+
 def render_extract_tab(df_filtered):
     """Renderiza editor de dados interativo."""
     st.markdown("### 📝 Extrato Editável")
@@ -180,7 +242,7 @@ def render_extract_tab(df_filtered):
         cols_to_show.remove('Banco')
         
     edited = st.data_editor(
-        df_filtered[cols_to_show].sort_values('Data', ascending=False),
+        df_filtered.assign(Valor=_reais(df_filtered['Centavos']))[cols_to_show].sort_values('Data', ascending=False),
         column_config={
             "Valor": st.column_config.NumberColumn(format="R$ %.2f"),
             "Data": st.column_config.DatetimeColumn(format="DD/MM/YYYY"),
@@ -190,7 +252,7 @@ def render_extract_tab(df_filtered):
     )
 
 def render_budget_tab(df, budgets, username):
-    """Renderiza a aba de Metas de Gastos."""
+    """Renderiza a aba de Metas de Gastos (df: cubo diário filtrado ou transações)."""
     import budget_manager  # Import local
     
     col1, col2 = st.columns([2, 1])
@@ -225,7 +287,9 @@ def render_budget_tab(df, budgets, username):
         
         # Totais
         total_budget = sum(budgets.values())
-        total_spent_general = df[df['Valor'] < 0]['Valor'].abs().sum()
+        # Gastos somados em centavos; as metas continuam em reais
+        spent_by_cat = _reais(transform.get_spent_by_category(df))
+        total_spent_general = spent_by_cat.sum()
         
         # Mostra barra geral se houver metas
         if total_budget > 0:
@@ -236,8 +300,6 @@ def render_budget_tab(df, budgets, username):
         st.markdown("---")
         
         # Renderiza barra por categoria meta
-        # Calcula gastos por categoria
-        spent_by_cat = df[df['Valor'] < 0].groupby('Categoria')['Valor'].sum().abs()
         
         # Ordena: Quem está mais perto de estourar aparece primeiro
         # Lista de tuplas (cat, %usage)
@@ -400,7 +462,8 @@ def render_manager_tab(username):
         pending = [b for b in bills if b['status'] != 'PAID' and b not in overdue] # Future pending
         next7 = [b for b in pending if today <= datetime.strptime(b['due_date'], "%Y-%m-%d").date() <= today + timedelta(days=7)]
         
-        val_pending = sum(b['amount'] for b in overdue + pending)
+        # Soma em centavos inteiros (valores das contas são gravados em reais)
+        val_pending = _reais(sum(round(b['amount'] * 100) for b in overdue + pending))
         
         k1, k2, k3, k4 = st.columns(4)
         
@@ -465,13 +528,14 @@ def render_manager_tab(username):
         with side_col:
             st.markdown("### 📊 Divisão")
             with st.container(border=True):
-                # Calculate per assignee
+                # Calculate per assignee (centavos inteiros; valores gravados em reais)
                 stats = {}
                 for b in bills:
                     who = b.get('assignee', 'N/A')
                     if who not in stats: stats[who] = {'total':0, 'paid':0}
-                    stats[who]['total'] += b['amount']
-                    if b['status'] == 'PAID': stats[who]['paid'] += b['amount']
+                    centavos = round(b['amount'] * 100)
+                    stats[who]['total'] += centavos
+                    if b['status'] == 'PAID': stats[who]['paid'] += centavos
                 
                 if not stats:
                     st.caption("Sem dados.")
@@ -480,7 +544,7 @@ def render_manager_tab(username):
                     pend = s['total'] - s['paid']
                     st.markdown(f"**{p.split('@')[0]}**")
                     if pend > 0:
-                        st.caption(f"Falta pagar: :red[R$ {pend:,.2f}]")
+                        st.caption(f"Falta pagar: :red[R$ {_reais(pend):,.2f}]")
                     else:
                         st.caption(":green[Quitado!]")
                     st.progress(s['paid']/s['total'] if s['total'] > 0 else 0)